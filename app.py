@@ -3,19 +3,45 @@
 #----------------------------------------------------------------------------#
 
 import json
+import math
+import os
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql
 import logging
 import re
-from datetime import datetime
+import click
+import random
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import count, groupby
+from urllib.parse import urlencode
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from wtforms.validators import ValidationError
 from forms import *
+from pagination import decode_cursor, keyset_paginate, keyset_paginate_parts
+from search import PostgresSearch
+from facets import TableFacets
+from cache import PageCache
+from pooling import InstrumentedQueuePool, init_statement_timeouts, pool_stats
+from routing import RoutingSQLAlchemy, read_only
+from importer import BulkImporter, RowChecker, read_records, rejects_path
+from export import FORMATS as EXPORT_FORMATS, export_response
+from conditional import Version, conditional
+from plancheck import check_plans
+import benchmark
+from phones import normalize_phone
+from times import parse_time
+from geo import KM_PER_DEGREE, Geocoder
+from images import ImageProxy
+from assets import Assets
+from profiling import Profiler, timed_filter
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -23,23 +49,40 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+if 'SQLALCHEMY_ENGINE_OPTIONS' in app.config:
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'].setdefault('poolclass', InstrumentedQueuePool)
+db = RoutingSQLAlchemy(app)
+init_statement_timeouts(app, db)
 migrate = Migrate(app, db)
-
-def validPhone(number):
-    regex = r'\w{3}-\w{3}-\w{4}'
-    msgFormat = 'Not a valid phone number. Phone numbers must be 333-222-1111.'
-    msgLength = 'Not a valid phone number. Phone numbers should be 10 digits with dashes (-).'
-    match = re.match(regex, str(number))
-    if (match is None and str(number) != ''):
-        message = msgFormat
-        raise ValidationError(message)
-    elif len(str(number)) > 12:
-        message = msgLength
-        raise ValidationError(message)
+page_cache = PageCache(app)
+profiler = Profiler(app)
+geocoder = Geocoder(app.config['GEOCODING_TABLE'])
+images = ImageProxy(app)
+assets = Assets(app)
 
 # TODO: connect to a local postgresql database
 
+def search_backend():
+  # Trigram-indexed search, see search.py.
+  if 'search' not in app.extensions:
+    app.extensions['search'] = PostgresSearch(db.session)
+  return app.extensions['search']
+
+def facet_backend():
+  # Trigger-maintained counts, see facets.py.
+  if 'facets' not in app.extensions:
+    app.extensions['facets'] = TableFacets(db.session, GenreCount.__table__)
+  return app.extensions['facets']
+
+def genre_filter(query, model):
+  # ?genre= narrows a listing to one genre through the GIN index on genres.
+  genre = request.args.get('genre')
+  return query.filter(model.genres.contains([genre])) if genre else query
+
+def form_flag(name):
+  # The Yes/No selects of the forms post 'True' or 'False'.
+  return request.form.get(name) == 'True'
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -52,13 +95,27 @@ class Venue(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
+    # position of the city from the geocoding table, see geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geocell = db.Column(db.BigInteger)
     phone = db.Column(db.String(120))
+    # E.164 form of phone, see phones.py
+    phone_e164 = db.Column(db.String(16), index=True)
     website = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
+    genres = db.Column(postgresql.ARRAY(db.String(120)), nullable=False)
     seeking_talent = db.Column(db.Boolean(), nullable=False, default=False)
     seeking_description = db.Column(db.String(120))
+    # maintained by a database trigger, see search.py
+    search_text = db.Column(db.Text)
+    # bumped whenever the entity's page changes, see venue_changed()
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # shows before/after ShowRollover.counted_until, see show_created()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     venue_shows = db.relationship('Show', backref='venue_shows', lazy=True)
 
     def __repr__(self):
@@ -66,6 +123,11 @@ class Venue(db.Model):
     
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+db.Index('ix_venue_city_state', Venue.city, Venue.state, Venue.id)
+db.Index('ix_venue_geocell_id', Venue.geocell, Venue.id)
+db.Index('ix_venue_name_lower', db.func.lower(Venue.name))
+db.Index('ix_venue_genres', Venue.genres, postgresql_using='gin')
+
 class Artist(db.Model):
     __tablename__ = 'artist'
 
@@ -74,12 +136,22 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
+    # E.164 form of phone, see phones.py
+    phone_e164 = db.Column(db.String(16), index=True)
     website = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=False)
+    genres = db.Column(postgresql.ARRAY(db.String(120)), nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean(), nullable=False, default=False)
     seeking_description = db.Column(db.String(120))
+    # maintained by a database trigger, see search.py
+    search_text = db.Column(db.Text)
+    # bumped whenever the entity's page changes, see artist_changed()
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # shows before/after ShowRollover.counted_until, see show_created()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     artist_shows = db.relationship('Show', backref='artist_shows', lazy=True)
 
     def __repr__(self):
@@ -87,6 +159,9 @@ class Artist(db.Model):
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+db.Index('ix_artist_name_lower', db.func.lower(Artist.name))
+db.Index('ix_artist_genres', Artist.genres, postgresql_using='gin')
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 class Show(db.Model):
       __tablename__ = 'show'
@@ -95,21 +170,295 @@ class Show(db.Model):
       artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), nullable=False)
       venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), nullable=False)
       start_time = db.Column(db.DateTime, nullable=False)
+      # Overlapping [start_time, end_time) bookings of one venue or one
+      # artist are rejected by exclusion constraints, see booking_conflict().
+      end_time = db.Column(db.DateTime, nullable=False)
 
       def __repr__(self):
         return f'<Show {self.id} {self.start_time}>'
 
+db.Index('ix_show_venue_id_start_time', Show.venue_id, Show.start_time)
+db.Index('ix_show_artist_id_start_time', Show.artist_id, Show.start_time)
+db.Index('ix_show_start_time', Show.start_time, Show.id)
+
+class DataVersion(db.Model):
+    # Counters per collection ('venues', 'artists', 'shows'), bumped by every
+    # write that changes what its listing shows. A collection's version is
+    # the sum of its SHARDS rows; each transaction bumps one row chosen at
+    # random, so concurrent writes rarely wait on each other.
+    __tablename__ = 'data_version'
+    SHARDS = 16
+
+    name = db.Column(db.String(40), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    version = db.Column(db.BigInteger, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
+
+class GenreCount(db.Model):
+    # Venues ('venue') or artists ('artist') of a genre in one city, or in
+    # all (city and state ''). Kept by database triggers, see facets.py.
+    __tablename__ = 'genre_count'
+
+    kind = db.Column(db.String(10), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<GenreCount {self.kind} {self.genre} {self.city} {self.count}>'
+
+class ShowRollover(db.Model):
+    # A single row. The show counters of venues and artists count shows
+    # starting before counted_until as past and the others as upcoming;
+    # roll_over_shows() moves it forward.
+    __tablename__ = 'show_rollover'
+
+    id = db.Column(db.Integer, primary_key=True)
+    counted_until = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ShowRollover {self.counted_until}>'
+
+#----------------------------------------------------------------------------#
+# Change tracking.
+#----------------------------------------------------------------------------#
+
+# Write handlers call venue_changed(), artist_changed() and show_created()
+# before committing. Version counters are bumped in the writing transaction,
+# so validators change atomically with the data. Cached pages are
+# invalidated once the commit has succeeded. Detail pages are tagged with
+# their own entity ('venue:3') and with the entities they list
+# ('ref:artist:7').
+
+def on_commit(fn, *args):
+  db.session.info.setdefault('on_commit', []).append((fn, args))
+
+@db.event.listens_for(db.session, 'after_commit')
+def run_on_commit(session):
+  for fn, args in session.info.pop('on_commit', []):
+    fn(*args)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_on_commit(session):
+  session.info.pop('on_commit', None)
+
+def bump_versions(model, criterion, **values):
+  values.update(version=model.version + 1, updated_at=datetime.utcnow())
+  model.query.filter(criterion).update(values, synchronize_session=False)
+
+def bump_collections(*names):
+  # Applied once, when the transaction commits.
+  db.session.info.setdefault('bump_collections', set()).update(names)
+
+@db.event.listens_for(db.session, 'before_commit')
+def apply_collection_bumps(session):
+  # One statement, at the end of the transaction, so the counter rows are
+  # locked briefly and always in the same order.
+  names = session.info.pop('bump_collections', None)
+  if names:
+    session.query(DataVersion) \
+      .filter(DataVersion.name.in_(sorted(names)),
+              DataVersion.shard == random.randrange(DataVersion.SHARDS)) \
+      .update({'version': DataVersion.version + 1, 'updated_at': datetime.utcnow()},
+              synchronize_session=False)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_collection_bumps(session):
+  session.info.pop('bump_collections', None)
+
+def venue_changed(*venue_ids, bumped=False):
+  # No ids for a newly created venue, which no page shows yet. Deletes must
+  # call this before deleting, while the venues' shows still point at the
+  # artists whose pages list them. bumped: the caller has bumped those
+  # versions itself, e.g. through shows_deleted().
+  if not venue_ids:
+    bump_collections('venues')
+    on_commit(page_cache.invalidate, 'venues')
+  else:
+    if not bumped:
+      bump_versions(Venue, Venue.id.in_(venue_ids))
+      bump_versions(Artist, Artist.id.in_(
+        db.session.query(Show.artist_id).filter(Show.venue_id.in_(venue_ids))))
+    bump_collections('venues', 'shows')
+    on_commit(page_cache.invalidate, 'venues', 'shows',
+              *[tag % id for id in venue_ids for tag in ('venue:%s', 'ref:venue:%s')])
+
+def artist_changed(*artist_ids, bumped=False):
+  if not artist_ids:
+    bump_collections('artists')
+    on_commit(page_cache.invalidate, 'artists')
+  else:
+    # Venue rows are locked before artist rows everywhere, or concurrent
+    # venue and artist edits could deadlock.
+    if not bumped:
+      bump_versions(Venue, Venue.id.in_(
+        db.session.query(Show.venue_id).filter(Show.artist_id.in_(artist_ids))))
+      bump_versions(Artist, Artist.id.in_(artist_ids))
+    bump_collections('artists', 'shows')
+    on_commit(page_cache.invalidate, 'artists', 'shows',
+              *[tag % id for id in artist_ids for tag in ('artist:%s', 'ref:artist:%s')])
+
+def show_created(venue_id, artist_id, start_time):
+  # Holding the rollover row shared keeps a concurrent roll_over_shows()
+  # from moving the boundary between this check and the commit.
+  counter = 'upcoming_shows_count' if start_time >= counted_until(lock=True) else 'past_shows_count'
+  bump_versions(Venue, Venue.id == venue_id, **{counter: getattr(Venue, counter) + 1})
+  bump_versions(Artist, Artist.id == artist_id, **{counter: getattr(Artist, counter) + 1})
+  bump_collections('venues', 'shows')
+  on_commit(page_cache.invalidate, 'venues', 'shows', 'venue:%s' % venue_id, 'artist:%s' % artist_id)
+
+def shows_deleted(criterion, until=None):
+  # Call before deleting the shows matching criterion, or the venue or
+  # artist they cascade from. Bumps the versions of the venues and artists
+  # that lose shows. until: counted_until(lock=True), if already read.
+  if until is None:
+    until = counted_until(lock=True)
+  for model, column in SHOW_COUNTERS:
+    shows = db.session.query(db.func.count(Show.id)).filter(criterion, column == model.id)
+    bump_versions(model, model.id.in_(db.session.query(column).filter(criterion)),
+      upcoming_shows_count=model.upcoming_shows_count - shows.filter(Show.start_time >= until).as_scalar(),
+      past_shows_count=model.past_shows_count - shows.filter(Show.start_time < until).as_scalar())
+
+#  Show counters
+#  ----------------------------------------------------------------
+#  Listings read upcoming/past show counts from the venue and artist rows.
+#  Writes keep them exact relative to ShowRollover.counted_until; shows that
+#  start later are moved from upcoming to past by `flask roll-over-shows`,
+#  which should run every minute or so.
+
+SHOW_COUNTERS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+def counted_until(lock=False):
+  query = db.session.query(ShowRollover.counted_until)
+  if lock:
+    query = query.with_for_update(read=True)
+  return query.scalar()
+
+def roll_over_shows(now=None):
+  """Count the shows that started since the last run as past. Returns the
+  number of shows moved."""
+  now = now or datetime.now()
+  rollover = ShowRollover.query.with_for_update().one()
+  if now <= rollover.counted_until:
+    return 0
+  due = db.and_(Show.start_time >= rollover.counted_until, Show.start_time < now)
+  moved = db.session.query(db.func.count(Show.id)).filter(due).scalar()
+  if moved:
+    for model, column in SHOW_COUNTERS:
+      started = db.session.query(db.func.count(Show.id)).filter(due, column == model.id).as_scalar()
+      bump_versions(model, model.id.in_(db.session.query(column).filter(due)),
+        upcoming_shows_count=model.upcoming_shows_count - started,
+        past_shows_count=model.past_shows_count + started)
+    bump_collections('venues')
+    on_commit(page_cache.invalidate, 'venues')
+  rollover.counted_until = now
+  return moved
+
+def recount_shows(now=None):
+  # Recomputes every counter, e.g. after a bulk import of shows.
+  now = now or datetime.now()
+  rollover = ShowRollover.query.with_for_update().one()
+  for model, column in SHOW_COUNTERS:
+    shows = db.session.query(db.func.count(Show.id)).filter(column == model.id)
+    bump_versions(model, db.true(),
+      upcoming_shows_count=shows.filter(Show.start_time >= now).as_scalar(),
+      past_shows_count=shows.filter(Show.start_time < now).as_scalar())
+  bump_collections('venues')
+  on_commit(page_cache.invalidate, 'venues')
+  rollover.counted_until = now
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+# Used with @conditional by the pages and the API. Each costs one query that
+# reads version counters and, for pages that split shows into upcoming and
+# past, the show starts around now. Show start times are local time;
+# updated_at columns are UTC.
+
+def show_starts(now, *criteria):
+  # Upcoming shows turn into past ones without any write: the next start is
+  # the moment a page's upcoming/past split changes, the last one before now
+  # is when it last did.
+  next_start = db.session.query(db.func.min(Show.start_time)) \
+    .filter(Show.start_time >= now, *criteria).as_scalar()
+  last_start = db.session.query(db.func.max(Show.start_time)) \
+    .filter(Show.start_time < now, *criteria).as_scalar()
+  return next_start, last_start
+
+def last_modified(updated_at, last_start=None):
+  if last_start is not None:
+    last_start = last_start.astimezone(timezone.utc).replace(tzinfo=None)
+    if updated_at is None or last_start > updated_at:
+      return last_start
+  return updated_at
+
+def collections_version(*names):
+  # Counters only ever increase, so their sum changes whenever one does.
+  version, updated_at = db.session.query(
+      db.func.sum(DataVersion.version), db.func.max(DataVersion.updated_at)) \
+    .filter(DataVersion.name.in_(names)).one()
+  return Version((version,), updated_at)
+
+def entity_version(model, show_column, id):
+  # show_column is the Show foreign key that points at model.
+  next_start, last_start = show_starts(datetime.now(), show_column == model.id)
+  row = db.session.query(model.version, model.updated_at, next_start, last_start) \
+    .filter(model.id == id).first()
+  if row is None:
+    abort(404)
+  version, updated_at, next_start, last_start = row
+  return Version((version, next_start), last_modified(updated_at, last_start))
+
+def venue_version(venue_id):
+  return entity_version(Venue, Show.venue_id, venue_id)
+
+def artist_version(artist_id):
+  return entity_version(Artist, Show.artist_id, artist_id)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format):
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+@lru_cache(maxsize=None)
+def datetime_locale(locale):
+  return babel.Locale.parse(locale)
+
+@timed_filter
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+  # datetime objects are formatted directly with a compiled pattern; only
+  # strings go through dateutil. Naive datetimes keep their wall clock time,
+  # as babel.dates.format_datetime() renders them in UTC.
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  return datetime_pattern(format).apply(value, datetime_locale(locale))
+
+@timed_filter
+def format_datetimes(values, format='medium', locale=babel.dates.LC_TIME):
+  # Batch form for lists of shows; equal times are only formatted once.
+  formatted = {}
+  result = []
+  for value in values:
+    if value not in formatted:
+      formatted[value] = format_datetime(value, format, locale)
+    result.append(formatted[value])
+  return result
+
+def show_times(shows):
+  return format_datetimes([show.start_time for show in shows], 'full')
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -126,80 +475,82 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
+@conditional(lambda: collections_version('venues'))
+@page_cache.cached('venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  venues = Venue.query.all()
-  locations = set()
-  for venue in venues:
-    locations.add((venue.city,venue.state))
-  for location in locations:
-    data.append({
-      "city": location[0],
-      "state": location[1],
-      "venues": []
-    })
-  for venue in venues:
-    num_shows = 0
-    for entry in data:
-      if entry['city'] == venue.city and entry['state'] == venue.state:
-        entry['venues'].append({
-          'id': venue.id,
-          'name': venue.name,
-          'num_upcoming_shows': num_shows
-        })
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+  # Rows come ordered by area so consecutive rows can be folded into areas
+  # as the template iterates, instead of rescanning the list per venue.
+  page = keyset_paginate(genre_filter(venue_rows(), Venue), [Venue.city, Venue.state, Venue.id])
+  return render_template('pages/venues.html', areas=group_by_area(page), page=page,
+                         facets=facet_backend().counts(Venue), genre=request.args.get('genre'))
+
+def venue_rows():
+  return db.session.query(
+    Venue.city, Venue.state, Venue.id, Venue.name,
+    Venue.upcoming_shows_count.label('num_upcoming_shows'))
+
+def group_by_area(rows):
+  for (city, state), area_rows in groupby(rows, key=lambda row: (row.city, row.state)):
+    yield {
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": row.id,
+        "name": row.name,
+        "num_upcoming_shows": row.num_upcoming_shows
+      } for row in area_rows]
+    }
+
+@app.route('/venues/search', methods=['GET', 'POST'])
+@read_only
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  # response={
-  #   "count": 1,
-  #   "data": [{
-  #     "id": 2,
-  #     "name": "The Dueling Pianos Bar",
-  #     "num_upcoming_shows": 0,
-  #   }]
-  # }
-  venues = Venue.query.filter(Venue.name.ilike('%' + request.form.get('search_term') + '%')).all()
+  # Matches name, city, state and genres, best match first.
+  # The term is read from the form on the first POST and from the query
+  # string when following next/prev page links.
+  search_term = request.values.get('search_term', '')
+  genre = request.values.get('genre')
+  result = search_backend().search(Venue, search_term, genre=genre)
   response = {
-    "count": len(venues),
-    "data": venues
+    "count": result.count,
+    "data": result.page
   }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                         facets=facet_backend().counts(Venue), genre=genre)
 
 @app.route('/venues/<int:venue_id>')
+@read_only
+@conditional(venue_version)
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
-  ## shows the venue page with the given venue_id
-  ## TODO: replace with real venue data from the venues table, using venue_id
-  data = Venue.query.filter_by(id=venue_id).outerjoin(Show).order_by('start_time').outerjoin(Artist).one()
-  upcoming_shows = []
-  past_shows = []
-  for show in data.venue_shows:
-    if show.start_time >= datetime.now():
-      upcoming_shows.append({
-        "artist_image_link": show.artist_shows.image_link,
-        "artist_id": show.artist_id,
-        "artist_name": show.artist_shows.name,
-        "start_time": format_datetime(str(show.start_time))})
-    elif show.start_time < datetime.now():
-      past_shows.append({
-        "artist_image_link": show.artist_shows.image_link,
-        "artist_id": show.artist_id,
-        "artist_name": show.artist_shows.name,
-        "start_time": format_datetime(str(show.start_time))})
-    else:
-      print('show not processed')
-  data.upcoming_shows_count = len(upcoming_shows)
-  data.upcoming_shows = upcoming_shows
-  data.past_shows_count = len(past_shows)
-  data.past_shows = past_shows
+  # shows the venue page with the given venue_id
+  data = Venue.query.filter_by(id=venue_id).first_or_404()
+  shows = Show.query.filter_by(venue_id=venue_id).options(db.joinedload('artist_shows', innerjoin=True).load_only('name', 'image_link'))
+  upcoming, past = split_shows(shows, datetime.now())
+  page_cache.tag(*set('ref:artist:%s' % show.artist_id for show in upcoming + past))
+  data.upcoming_shows = [{
+    "artist_image_link": show.artist_shows.image_link,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_shows.name,
+    "start_time": start_time} for show, start_time in zip(upcoming, show_times(upcoming))]
+  data.past_shows = [{
+    "artist_image_link": show.artist_shows.image_link,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_shows.name,
+    "start_time": start_time} for show, start_time in zip(past, show_times(past))]
+  data.upcoming_shows_count = len(data.upcoming_shows)
+  data.past_shows_count = len(data.past_shows)
 
   return render_template('pages/show_venue.html', venue=data)
 
+def split_shows(shows, now):
+  # Upcoming and past shows are filtered and ordered by the database against
+  # the same request-time snapshot. The caller eager loads the counterpart
+  # entity, so each half is a single SELECT however many shows there are.
+  upcoming = shows.filter(Show.start_time >= now).order_by(Show.start_time, Show.id).all()
+  past = shows.filter(Show.start_time < now).order_by(Show.start_time, Show.id).all()
+  return upcoming, past
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -214,24 +565,26 @@ def create_venue_submission():
   # TODO: modify data to be the data object returned from db insertion
   # on successful db insert, flash success
   try:
-    validPhone(request.form['phone'])
+    phone_e164 = normalize_phone(request.form['phone'])
     venue = Venue(name=request.form['name'],
       city=request.form['city'], state=request.form['state'],
-      address=request.form['address'], phone=request.form['phone'],
+      address=request.form['address'], phone=request.form['phone'], phone_e164=phone_e164,
       genres=request.form.getlist('genres'),
       facebook_link=request.form['facebook_link'],
       website=request.form['website'],
-      seeking_talent=request.form['seeking_talent'],
-      seeking_description=request.form['seeking_description'])
+      seeking_talent=form_flag('seeking_talent'),
+      seeking_description=request.form['seeking_description'],
+      **geocoder.locate(request.form['city'], request.form['state']))
     db.session.add(venue)
+    venue_changed()
     db.session.commit()
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
   except ValidationError as e:
     db.session.rollback()
-    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed. ' + str(e))
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed. ' + str(e), 'error')
   except:
     db.session.rollback()
-    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.', 'error')
   finally:
     db.session.close()
   # TODO: on unsuccessful db insert, flash an error instead.
@@ -245,13 +598,15 @@ def delete_venue(venue_id):
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
   try:
     name = Venue.query.filter_by(id=venue_id).one().name
+    shows_deleted(Show.venue_id == venue_id)
+    venue_changed(venue_id)
     Venue.query.filter_by(id=venue_id).delete()
     db.session.commit()
     flash('Venue ' + name + ' was successfully deleted!')
   except:
     error = True
     db.session.rollback()
-    flash('An error occurred. Venue ' + name + ' could not be deleted!')
+    flash('An error occurred. Venue ' + name + ' could not be deleted!', 'error')
   finally:
     db.session.close()
   
@@ -263,67 +618,51 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_only
+@conditional(lambda: collections_version('artists'))
+@page_cache.cached('artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = Artist.query.order_by('id').all()
-  # data=[{
-  #   "id": 4,
-  #   "name": "Guns N Petals",
-  # }, {
-  #   "id": 5,
-  #   "name": "Matt Quevedo",
-  # }, {
-  #   "id": 6,
-  #   "name": "The Wild Sax Band",
-  # }]
-  return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
+  data = keyset_paginate(genre_filter(Artist.query.with_entities(Artist.id, Artist.name), Artist),
+                         [Artist.id])
+  return render_template('pages/artists.html', artists=data, page=data,
+                         facets=facet_backend().counts(Artist), genre=request.args.get('genre'))
+
+@app.route('/artists/search', methods=['GET', 'POST'])
+@read_only
 def search_artists():
-  ## TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  ## seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  ## search for "band" should return "The Wild Sax Band".
-  # response={
-  #   "count": 1,
-  #   "data": [{
-  #     "id": 4,
-  #     "name": "Guns N Petals",
-  #     "num_upcoming_shows": 0,
-  #   }]
-  # }
-  artists = Artist.query.filter(Artist.name.ilike('%' + request.form.get('search_term') + '%')).all()
+  # Matches name, city, state and genres, best match first.
+  search_term = request.values.get('search_term', '')
+  genre = request.values.get('genre')
+  result = search_backend().search(Artist, search_term, genre=genre)
   response = {
-    "count": len(artists),
-    "data": artists
+    "count": result.count,
+    "data": result.page
   }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                         facets=facet_backend().counts(Artist), genre=genre)
 
 @app.route('/artists/<int:artist_id>')
+@read_only
+@conditional(artist_version)
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
-  ## shows the venue page with the given venue_id
-  ## TODO: replace with real venue data from the venues table, using venue_id
-  data = Artist.query.filter_by(id=artist_id).outerjoin(Show).order_by(Show.start_time).outerjoin(Venue).one()
-  upcoming_shows = []
-  past_shows = []
-  for show in data.artist_shows:
-    if show.start_time >= datetime.now():
-      upcoming_shows.append({
-        "venue_image_link": show.venue_shows.image_link,
-        "venue_id": show.venue_id,
-        "venue_name": show.venue_shows.name,
-        "start_time": format_datetime(str(show.start_time))})
-    elif show.start_time < datetime.now():
-      past_shows.append({
-        "venue_image_link": show.venue_shows.image_link,
-        "venue_id": show.venue_id,
-        "venue_name": show.venue_shows.name,
-        "start_time": format_datetime(str(show.start_time))})
-    else:
-      print('show not processed')
-  data.upcoming_shows_count = len(upcoming_shows)
-  data.upcoming_shows = upcoming_shows
-  data.past_shows_count = len(past_shows)
-  data.past_shows = past_shows
+  # shows the artist page with the given artist_id
+  data = Artist.query.filter_by(id=artist_id).first_or_404()
+  shows = Show.query.filter_by(artist_id=artist_id).options(db.joinedload('venue_shows', innerjoin=True).load_only('name', 'image_link'))
+  upcoming, past = split_shows(shows, datetime.now())
+  page_cache.tag(*set('ref:venue:%s' % show.venue_id for show in upcoming + past))
+  data.upcoming_shows = [{
+    "venue_image_link": show.venue_shows.image_link,
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_shows.name,
+    "start_time": start_time} for show, start_time in zip(upcoming, show_times(upcoming))]
+  data.past_shows = [{
+    "venue_image_link": show.venue_shows.image_link,
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_shows.name,
+    "start_time": start_time} for show, start_time in zip(past, show_times(past))]
+  data.upcoming_shows_count = len(data.upcoming_shows)
+  data.past_shows_count = len(data.past_shows)
 
   return render_template('pages/show_artist.html', artist=data)
 
@@ -354,22 +693,25 @@ def edit_artist_submission(artist_id):
   # print(request.form['seeking_venues'])
   # print(bool(request.form['seeking_venues']))
   try:
-    validPhone(request.form['phone'])
+    phone_e164 = normalize_phone(request.form['phone'])
     artist = {
       "name": request.form['name'],
       "city": request.form['city'], "state": request.form['state'],
-      "phone": request.form['phone'], "genres": request.form.getlist('genres'),
+      "phone": request.form['phone'], "phone_e164": phone_e164,
+      "genres": request.form.getlist('genres'),
       "facebook_link": request.form['facebook_link'],
       "website": request.form['website'],
-      "seeking_venue": bool(request.form['seeking_venue']),
+      "seeking_venue": form_flag('seeking_venue'),
       "seeking_description": request.form['seeking_description']}
     Artist.query.filter_by(id=artist_id).update(artist)
+    artist_changed(artist_id)
     db.session.commit()
   except ValidationError as e:
     db.session.rollback()
-    flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated ' + str(e))
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated ' + str(e), 'error')
   except:
     db.session.rollback()
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated.', 'error')
   finally:
     db.session.close()
 
@@ -399,24 +741,28 @@ def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
   try:
-    validPhone(request.form['phone'])
+    phone_e164 = normalize_phone(request.form['phone'])
     venue = {
       "name": request.form['name'],
       "city": request.form['city'], "state": request.form['state'],
       "address": request.form['address'], "phone": request.form['phone'],
+      "phone_e164": phone_e164,
       "genres": request.form.getlist('genres'),
       "facebook_link": request.form['facebook_link'],
       "website": request.form['website'],
-      "seeking_talent": bool(request.form['seeking_talent']),
+      "seeking_talent": form_flag('seeking_talent'),
       "seeking_description": request.form['seeking_description']
     }
+    venue.update(geocoder.locate(venue['city'], venue['state']))
     Venue.query.filter_by(id=venue_id).update(venue)
+    venue_changed(venue_id)
     db.session.commit()
   except ValidationError as e:
     db.session.rollback()
-    flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated ' + str(e))
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated ' + str(e), 'error')
   except:
     db.session.rollback()
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.', 'error')
   finally:
     db.session.close()
 
@@ -437,25 +783,26 @@ def create_artist_submission():
   # TODO: modify data to be the data object returned from db insertion
   # on successful db insert, flash success
   try:
-    validPhone(request.form['phone'])
+    phone_e164 = normalize_phone(request.form['phone'])
     artist = Artist(name=request.form['name'],
       city=request.form['city'],state=request.form['state'],
-      phone=request.form['phone'],genres=request.form.getlist('genres'),
+      phone=request.form['phone'],phone_e164=phone_e164,genres=request.form.getlist('genres'),
       facebook_link=request.form['facebook_link'], website=request.form['website'],
-      seeking_venue=bool(request.form['seeking_venue']),
+      seeking_venue=form_flag('seeking_venue'),
       seeking_description=request.form['seeking_description'])
     # print(artist)
     db.session.add(artist)
+    artist_changed()
     db.session.commit()
     # print(Artist.query.all())
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   except ValidationError as e:
     db.session.rollback()
-    flash('An error occurred. Artist ' + request.form['name'] + ' phone number could not be updated ' + str(e))
+    flash('An error occurred. Artist ' + request.form['name'] + ' phone number could not be updated ' + str(e), 'error')
   except:
     error = True
     db.session.rollback()
-    flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.', 'error')
   finally:
     db.session.close()
 
@@ -468,13 +815,15 @@ def create_artist_submission():
 def delete_artist(artist_id):
   try:
     name = Artist.query.filter_by(id=artist_id).one().name
+    shows_deleted(Show.artist_id == artist_id)
+    artist_changed(artist_id)
     Artist.query.filter_by(id=artist_id).delete()
     db.session.commit()
     flash('Artist ' + name + ' was successfully deleted!')
   except:
     error = True
     db.session.rollback()
-    flash('An error occurred. Artist ' + name + ' could not be deleted!')
+    flash('An error occurred. Artist ' + name + ' could not be deleted!', 'error')
   finally:
     db.session.close()
   
@@ -484,22 +833,31 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_only
+@conditional(lambda: collections_version('shows'))
+@page_cache.cached('shows')
 def shows():
   ## displays list of shows at /shows
-  ## TODO: replace with real venues data.
-  ##       num_shows should be aggregated based on number of upcoming shows per venue.
+  page = keyset_paginate(show_rows(), [Show.start_time, Show.id])
   data = []
-  shows = Show.query.join("artist_shows").join("venue_shows").order_by(Show.start_time).all()
-  for show in shows:
+  for show, start_time in zip(page, show_times(page)):
     data.append({
       "venue_id": show.venue_id,
-      "venue_name": show.venue_shows.name,
+      "venue_name": show.venue_name,
       "artist_id": show.artist_id,
-      "artist_name": show.artist_shows.name,
-      "artist_image_link": show.artist_shows.image_link,
-      "start_time": format_datetime(str(show.start_time))
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": start_time
     })
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data, page=page)
+
+def show_rows():
+  return db.session.query(
+      Show.id, Show.start_time, Show.end_time, Show.venue_id, Venue.name.label('venue_name'),
+      Show.artist_id, Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
 
 @app.route('/shows/create')
 def create_shows():
@@ -513,18 +871,34 @@ def create_show_submission():
   # TODO: insert form data as a new Show record in the db, instead
   # error = False
   try:
+    start_time = parse_time(request.form['start_time'])
+    end_time = start_time + timedelta(minutes=show_duration())
     show = Show(
       artist_id=request.form['artist_id'],
       venue_id=request.form['venue_id'],
-      start_time=request.form['start_time'])
+      start_time=start_time, end_time=end_time)
     db.session.add(show)
+    show_created(show.venue_id, show.artist_id, show.start_time)
     db.session.commit()
     # on successful db insert, flash success
     flash('Show was successfully listed!')
+  except ValidationError as e:
+    db.session.rollback()
+    flash('Show could not be listed. ' + str(e), 'error')
+    return render_template('forms/new_show.html', form=ShowForm(request.form)), 400
+  except exc.IntegrityError as e:
+    db.session.rollback()
+    conflict = booking_conflict(e, request.form['venue_id'], request.form['artist_id'], start_time, end_time)
+    if conflict is None:
+      flash('An error occurred. Show could not be listed.', 'error')
+    else:
+      # Back to the form, filled in, to pick another time.
+      flash('Show could not be listed. ' + conflict, 'error')
+      return render_template('forms/new_show.html', form=ShowForm(request.form)), 409
   except:
     # error = True
     db.session.rollback()
-    flash('An error occurred. Show could not be listed.')
+    flash('An error occurred. Show could not be listed.', 'error')
   finally:
     db.session.close()
   # TODO: on unsuccessful db insert, flash an error instead.
@@ -532,6 +906,503 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+def show_duration():
+  # Minutes the show books its venue and artist for, within the bounds
+  # ShowForm.duration states.
+  try:
+    minutes = int(request.form.get('duration') or app.config['SHOW_DURATION_MINUTES'])
+  except ValueError:
+    raise ValidationError(SHOW_MINUTES.message)
+  if not SHOW_MINUTES.min <= minutes <= SHOW_MINUTES.max:
+    raise ValidationError(SHOW_MINUTES.message)
+  return minutes
+
+# Names of the exclusion constraints on show, see the add_show_end_time
+# migration.
+BOOKING_CONSTRAINTS = {
+  'show_venue_no_overlap': 'venue',
+  'show_artist_no_overlap': 'artist',
+}
+
+def booking_conflict(error, venue_id, artist_id, start_time, end_time):
+  # Describes the show that made an insert violate a booking constraint, or
+  # returns None for any other integrity error. The constraints check
+  # concurrent inserts too, so this only runs once one has failed.
+  constraint = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+  side = BOOKING_CONSTRAINTS.get(constraint)
+  if side is None:
+    return None
+  criterion = Show.venue_id == venue_id if side == 'venue' else Show.artist_id == artist_id
+  other = Show.query.filter(criterion, show_overlaps(start_time, end_time)) \
+    .options(db.joinedload('venue_shows').load_only('name'),
+             db.joinedload('artist_shows').load_only('name')) \
+    .order_by(Show.start_time).first()
+  if other is None:
+    return 'The %s is already booked at that time.' % side
+  return 'The %s is already booked from %s to %s (%s at %s).' % (
+    side, format_datetime(other.start_time), format_datetime(other.end_time),
+    other.artist_shows.name, other.venue_shows.name)
+
+def show_overlaps(start_time, end_time):
+  # Shows booked at any time in [start_time, end_time). Spelled like the
+  # exclusion constraints so that, next to an equality on venue_id or
+  # artist_id, it is answered from their GiST indexes.
+  return db.func.tsrange(Show.start_time, Show.end_time) \
+    .op('&&')(db.func.tsrange(start_time, end_time))
+
+#  Images
+#  ----------------------------------------------------------------
+
+@app.route('/images/<size>')
+@read_only
+def image(size):
+  # Resized copies of image links, see images.py. Templates link them with
+  # the thumbnail filter.
+  return images.serve(size, request.args.get('src', ''), request.args.get('sig', ''))
+
+@app.route('/assets/<filename>')
+@read_only
+def asset(filename):
+  # Content-hashed style and script bundles, see assets.py. Templates link
+  # them with asset_urls().
+  return assets.serve(filename)
+
+#  API
+#  ----------------------------------------------------------------
+#  JSON mirrors of the pages under /api/v1. ?fields=a,b limits each object
+#  to the named fields; listings take the same ?cursor= and ?per_page= as the
+#  pages. Every response carries an ETag derived from version counters, so a
+#  revalidation costs one small query.
+
+def api_fields(obj):
+  fields = request.args.get('fields')
+  if not fields:
+    return obj
+  wanted = set(fields.split(','))
+  return dict((key, value) for key, value in obj.items() if key in wanted)
+
+def api_page(page, serialize, **extra):
+  data = {
+    "data": [api_fields(serialize(item)) for item in page],
+    "next_cursor": page.next_cursor,
+    "prev_cursor": page.prev_cursor,
+    "next": page.next_url,
+    "prev": page.prev_url
+  }
+  data.update(extra)
+  return jsonify(data)
+
+def api_show(show, counterpart):
+  data = {"start_time": show.start_time.isoformat(), "end_time": show.end_time.isoformat()}
+  if counterpart == 'artist':
+    data.update(artist_id=show.artist_id, artist_name=show.artist_shows.name,
+                artist_image_link=show.artist_shows.image_link)
+  else:
+    data.update(venue_id=show.venue_id, venue_name=show.venue_shows.name,
+                venue_image_link=show.venue_shows.image_link)
+  return data
+
+@app.route('/api/v1/venues')
+@read_only
+@conditional(lambda: collections_version('venues'))
+def api_venues():
+  page = keyset_paginate(genre_filter(venue_rows(), Venue), [Venue.city, Venue.state, Venue.id])
+  return api_page(page, lambda row: {
+    "id": row.id, "name": row.name, "city": row.city, "state": row.state,
+    "num_upcoming_shows": row.num_upcoming_shows})
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@read_only
+@conditional(venue_version)
+def api_venue(venue_id):
+  venue = Venue.query.filter_by(id=venue_id).first_or_404()
+  shows = Show.query.filter_by(venue_id=venue_id) \
+    .options(db.joinedload('artist_shows', innerjoin=True).load_only('name', 'image_link'))
+  upcoming, past = split_shows(shows, datetime.now())
+  return jsonify(api_fields({
+    "id": venue.id, "name": venue.name, "genres": venue.genres,
+    "address": venue.address, "city": venue.city, "state": venue.state,
+    "latitude": venue.latitude, "longitude": venue.longitude,
+    "phone": venue.phone, "website": venue.website,
+    "facebook_link": venue.facebook_link, "image_link": venue.image_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "upcoming_shows": [api_show(show, 'artist') for show in upcoming],
+    "past_shows": [api_show(show, 'artist') for show in past],
+    "upcoming_shows_count": len(upcoming),
+    "past_shows_count": len(past)
+  }))
+
+@app.route('/api/v1/venues/search')
+@read_only
+@conditional(lambda: collections_version('venues'))
+def api_search_venues():
+  result = search_backend().search(Venue, request.args.get('search_term', ''),
+                                   genre=request.args.get('genre'))
+  return api_page(result.page, lambda hit: {"id": hit.id, "name": hit.name}, count=result.count)
+
+def api_facets(model):
+  # Number of venues or artists per genre, in all cities or in ?city=&state=.
+  facets = facet_backend().counts(model, request.args.get('city'), request.args.get('state'))
+  return jsonify({"data": [{"genre": facet.genre, "count": facet.count} for facet in facets]})
+
+@app.route('/api/v1/venues/genres')
+@read_only
+@conditional(lambda: collections_version('venues'))
+def api_venue_genres():
+  return api_facets(Venue)
+
+@app.route('/api/v1/venues/available')
+@read_only
+@conditional(lambda: collections_version('venues', 'shows'))
+def api_available_venues():
+  # Venues with no show overlapping [start, end), optionally in one city,
+  # state or genre. Each venue is checked with a probe of the
+  # show_venue_no_overlap index rather than by reading its shows.
+  try:
+    start_time = parse_time(request.args['start'])
+    end_time = parse_time(request.args['end'])
+  except (KeyError, ValueError, OverflowError):
+    abort(400)
+  if end_time <= start_time:
+    abort(400)
+  booked = db.session.query(Show.id).filter(Show.venue_id == Venue.id, show_overlaps(start_time, end_time))
+  venues = db.session.query(
+      Venue.id, Venue.name, Venue.city, Venue.state, Venue.genres,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')) \
+    .filter(~booked.exists())
+  for column in ('city', 'state'):
+    if request.args.get(column):
+      venues = venues.filter(getattr(Venue, column) == request.args[column])
+  if request.args.get('genre'):
+    venues = venues.filter(Venue.genres.contains([request.args['genre']]))
+  page = keyset_paginate(venues, [Venue.city, Venue.state, Venue.id])
+  return api_page(page, lambda row: {
+    "id": row.id, "name": row.name, "city": row.city, "state": row.state,
+    "genres": row.genres, "num_upcoming_shows": row.num_upcoming_shows},
+    start=start_time.isoformat(), end=end_time.isoformat())
+
+def venues_near(latitude, longitude, radius, box=None):
+  # One page of the venues within radius km of the point, and inside box if
+  # one is given, nearest first with their squared distance in degrees.
+  # Venues sit on the positions of the geocoding table, so the places around
+  # the point are found there. At most a page of venues of each, lowest id
+  # first, is read from the (geocell, id) index, all places in one
+  # statement: a page costs the same in a city of ten venues as in one of
+  # ten thousand, and empty places cost no round trip.
+  venues = db.session.query(
+    Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+    Venue.upcoming_shows_count.label('num_upcoming_shows'))
+  distance = db.literal_column('distance')
+  parts = [((value,), venues.add_columns(db.literal(value).label('distance'))
+                            .filter(Venue.geocell.in_(cells)))
+           for value, cells in geocoder.nearby(latitude, longitude, radius, box)]
+  return keyset_paginate_parts(parts, [distance, Venue.id])
+
+@app.route('/api/v1/venues/near')
+@read_only
+@conditional(lambda: collections_version('venues'))
+def api_venues_near():
+  # Venues within ?radius= km (NEAR_RADIUS_KM by default) of ?lat=&lon=,
+  # or inside ?bbox=west,south,east,north, nearest first.
+  try:
+    latitude, longitude = request.args.get('lat', type=float), request.args.get('lon', type=float)
+    box = None
+    if request.args.get('bbox'):
+      west, south, east, north = [float(value) for value in request.args['bbox'].split(',')]
+      box = (south, west, north, east)
+      if latitude is None or longitude is None:
+        latitude, longitude = (south + north) / 2, (west + east) / 2
+      scale = math.cos(math.radians(latitude))
+      # Distance to the farthest corner.
+      radius = KM_PER_DEGREE * max(math.hypot(lat - latitude, (lon - longitude) * scale)
+                                   for lat in (south, north) for lon in (west, east))
+    else:
+      radius = request.args.get('radius', app.config['NEAR_RADIUS_KM'], type=float)
+  except ValueError:
+    abort(400)
+  # A box may not reach further from its centre than a radius may.
+  if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180) \
+      or box is not None and not (-90 <= box[0] <= box[2] <= 90 and -180 <= box[1] <= box[3] <= 180) \
+      or not 0 < radius <= app.config['NEAR_MAX_RADIUS_KM']:
+    abort(400)
+  if request.args.get('cursor'):
+    direction, (distance, id) = decode_cursor(request.args['cursor'], 2)
+    if not isinstance(distance, (int, float)) or not isinstance(id, int):
+      abort(400)
+  page = venues_near(latitude, longitude, radius, box)
+  return api_page(page, lambda row: {
+    "id": row.id, "name": row.name, "city": row.city, "state": row.state,
+    "latitude": row.latitude, "longitude": row.longitude,
+    "distance_km": round(math.sqrt(row.distance) * KM_PER_DEGREE, 3),
+    "num_upcoming_shows": row.num_upcoming_shows})
+
+@app.route('/api/v1/artists')
+@read_only
+@conditional(lambda: collections_version('artists'))
+def api_artists():
+  page = keyset_paginate(genre_filter(Artist.query.with_entities(Artist.id, Artist.name), Artist),
+                         [Artist.id])
+  return api_page(page, lambda row: {"id": row.id, "name": row.name})
+
+@app.route('/api/v1/artists/genres')
+@read_only
+@conditional(lambda: collections_version('artists'))
+def api_artist_genres():
+  return api_facets(Artist)
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@read_only
+@conditional(artist_version)
+def api_artist(artist_id):
+  artist = Artist.query.filter_by(id=artist_id).first_or_404()
+  shows = Show.query.filter_by(artist_id=artist_id) \
+    .options(db.joinedload('venue_shows', innerjoin=True).load_only('name', 'image_link'))
+  upcoming, past = split_shows(shows, datetime.now())
+  return jsonify(api_fields({
+    "id": artist.id, "name": artist.name, "genres": artist.genres,
+    "city": artist.city, "state": artist.state, "phone": artist.phone,
+    "website": artist.website, "facebook_link": artist.facebook_link,
+    "image_link": artist.image_link, "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "upcoming_shows": [api_show(show, 'venue') for show in upcoming],
+    "past_shows": [api_show(show, 'venue') for show in past],
+    "upcoming_shows_count": len(upcoming),
+    "past_shows_count": len(past)
+  }))
+
+@app.route('/api/v1/artists/search')
+@read_only
+@conditional(lambda: collections_version('artists'))
+def api_search_artists():
+  result = search_backend().search(Artist, request.args.get('search_term', ''),
+                                   genre=request.args.get('genre'))
+  return api_page(result.page, lambda hit: {"id": hit.id, "name": hit.name}, count=result.count)
+
+@app.route('/api/v1/shows')
+@read_only
+@conditional(lambda: collections_version('shows'))
+def api_shows():
+  page = keyset_paginate(show_rows(), [Show.start_time, Show.id])
+  return api_page(page, lambda show: {
+    "id": show.id, "start_time": show.start_time.isoformat(), "end_time": show.end_time.isoformat(),
+    "venue_id": show.venue_id, "venue_name": show.venue_name,
+    "artist_id": show.artist_id, "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link})
+
+#  Phone lookup
+#  ----------------------------------------------------------------
+#  Phone numbers are matched on their E.164 form through the phone_e164
+#  indexes, whatever format they were entered or searched in.
+
+def phone_listings():
+  # Every venue and artist that has a phone number, as one relation.
+  return db.union_all(*[
+    db.session.query(model.phone_e164.label('phone'), db.literal(kind).label('kind'),
+                     model.id.label('id'), model.name.label('name'),
+                     model.city.label('city'), model.state.label('state'))
+      .filter(model.phone_e164.isnot(None))
+    for model, kind in ((Venue, 'venue'), (Artist, 'artist'))]).alias('listing')
+
+def group_listings(rows):
+  groups = {"venues": [], "artists": []}
+  for row in rows:
+    groups[row.kind + 's'].append({"id": row.id, "name": row.name, "city": row.city, "state": row.state})
+  return groups
+
+@app.route('/api/v1/phones/<phone>')
+@read_only
+@conditional(lambda phone: collections_version('venues', 'artists'))
+def api_phone(phone):
+  try:
+    phone_e164 = normalize_phone(phone)
+  except ValidationError:
+    abort(400)
+  listing = phone_listings()
+  rows = db.session.query(listing).filter(listing.c.phone == phone_e164) \
+    .order_by(listing.c.kind.desc(), listing.c.id)
+  return jsonify(dict(phone=phone_e164, **group_listings(rows)))
+
+@app.route('/api/v1/phones/duplicates')
+@read_only
+@conditional(lambda: collections_version('venues', 'artists'))
+def api_duplicate_phones():
+  # Numbers shared by more than one listing, e.g. a venue entered twice or
+  # an artist that is also listed as a venue. Paginated by number.
+  listing = phone_listings()
+  page = keyset_paginate(
+    db.session.query(listing.c.phone, db.func.count().label('listings'))
+      .group_by(listing.c.phone).having(db.func.count() > 1),
+    [listing.c.phone])
+  numbers = [row.phone for row in page]
+  rows = db.session.query(listing).filter(listing.c.phone.in_(numbers)) \
+    .order_by(listing.c.phone, listing.c.kind.desc(), listing.c.id).all() if numbers else []
+  by_phone = dict((phone, list(group)) for phone, group in groupby(rows, key=lambda row: row.phone))
+  return api_page(page, lambda row: dict(phone=row.phone, listings=row.listings,
+                                         **group_listings(by_phone.get(row.phone, []))))
+
+#  Bulk changes
+#  ----------------------------------------------------------------
+#  DELETE /api/v1/venues (or /artists) with {"ids": [...]} deletes many rows;
+#  PATCH with {"ids": [...], "set": {"field": value}} applies the same change
+#  to many rows. Each request is one transaction, sent in statements of
+#  BULK_CHUNK_SIZE ids, and reports a result per id. Shows go with their
+#  venue or artist through the foreign key cascade.
+#
+#  A chunk costs three statements: for a delete, the show counters of its
+#  venues and of its artists, then the DELETE; for a patch, the versions of
+#  its venues and of its artists, then the UPDATE. Venue rows are always
+#  locked first, see artist_changed(). The collection versions are bumped
+#  once, when the request commits.
+
+def bulk_request():
+  body = request.get_json(silent=True)
+  ids = body.get('ids') if isinstance(body, dict) else None
+  if not isinstance(ids, list) or not ids or len(ids) > app.config['BULK_MAX_IDS'] \
+      or not all(type(id) is int for id in ids):
+    abort(400)
+  # Duplicates are dropped, the order kept for the results.
+  return list(dict.fromkeys(ids)), body
+
+def chunked(ids):
+  size = app.config['BULK_CHUNK_SIZE']
+  for start in range(0, len(ids), size):
+    yield ids[start:start + size]
+
+def id_in(table, ids):
+  # id = ANY(:ids) binds one array, so the statement text (and Postgres'
+  # cached plan) is the same whatever the number of ids.
+  return table.c.id == db.any_(db.bindparam('ids', ids, type_=db.ARRAY(db.Integer)))
+
+def bulk_results(ids, found, status):
+  return [dict(id=id, status=status, **found[id]) if id in found else
+          {"id": id, "status": "not_found"} for id in ids]
+
+def bulk_delete(model, show_column, changed):
+  ids, body = bulk_request()
+  table = model.__table__
+  until = counted_until(lock=True)
+  deleted = {}
+  for chunk in chunked(ids):
+    # Counters and versions of the rows the cascade touches are updated
+    # while the shows still exist.
+    shows_deleted(show_column.in_(chunk), until)
+    rows = db.session.execute(table.delete().where(id_in(table, chunk))
+                              .returning(table.c.id, table.c.name))
+    deleted.update((id, {"name": name}) for id, name in rows)
+  if deleted:
+    changed(*deleted, bumped=True)
+  db.session.commit()
+  return jsonify({"deleted": len(deleted), "results": bulk_results(ids, deleted, 'deleted')})
+
+def bulk_patch(model, kind, changed):
+  ids, body = bulk_request()
+  if not isinstance(body.get('set'), dict):
+    abort(400)
+  errors = []
+  values = RowChecker(normalize_phone, locate=geocoder.locate).changes(kind, body['set'], errors)
+  if errors:
+    return jsonify({"errors": errors}), 400
+  table = model.__table__
+  updated = {}
+  for chunk in chunked(ids):
+    # Bumped first, so the rows are locked in the usual order.
+    changed(*chunk)
+    rows = db.session.execute(table.update().where(id_in(table, chunk)).values(**values)
+                              .returning(table.c.id))
+    updated.update((id, {}) for id, in rows)
+  db.session.commit()
+  return jsonify({"updated": len(updated), "results": bulk_results(ids, updated, 'updated')})
+
+@app.route('/api/v1/venues', methods=['DELETE'])
+def api_delete_venues():
+  return bulk_delete(Venue, Show.venue_id, venue_changed)
+
+@app.route('/api/v1/venues', methods=['PATCH'])
+def api_patch_venues():
+  return bulk_patch(Venue, 'venue', venue_changed)
+
+@app.route('/api/v1/artists', methods=['DELETE'])
+def api_delete_artists():
+  return bulk_delete(Artist, Show.artist_id, artist_changed)
+
+@app.route('/api/v1/artists', methods=['PATCH'])
+def api_patch_artists():
+  return bulk_patch(Artist, 'artist', artist_changed)
+
+#  Exports
+#  ----------------------------------------------------------------
+
+EXPORT_COLUMNS = {
+  'shows': ['id', 'start_time', 'end_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name'],
+  'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'website',
+             'image_link', 'facebook_link', 'seeking_talent', 'seeking_description'],
+  'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'website',
+              'image_link', 'facebook_link', 'seeking_venue', 'seeking_description'],
+}
+
+def export_show_filters():
+  # ?start= and ?end= bound start_time (end is exclusive); ?venue_id= and
+  # ?artist_id= pick one venue or artist.
+  criteria = []
+  try:
+    if request.args.get('start'):
+      criteria.append(Show.start_time >= parse_time(request.args['start']))
+    if request.args.get('end'):
+      criteria.append(Show.start_time < parse_time(request.args['end']))
+  except (ValueError, OverflowError):
+    abort(400)
+  for name, column in (('venue_id', Show.venue_id), ('artist_id', Show.artist_id)):
+    if request.args.get(name):
+      value = request.args.get(name, type=int)
+      if value is None:
+        abort(400)
+      criteria.append(column == value)
+  return criteria
+
+def export(kind, format, query):
+  if format not in EXPORT_FORMATS:
+    abort(404)
+  return export_response(query, EXPORT_COLUMNS[kind], format, kind,
+                         compress=request.args.get('gzip') == '1')
+
+@app.route('/export/shows.<format>')
+@read_only
+def export_shows(format):
+  shows = db.session.query(
+      Show.id, Show.start_time, Show.end_time, Show.venue_id, Venue.name.label('venue_name'),
+      Show.artist_id, Artist.name.label('artist_name')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(*export_show_filters()) \
+    .order_by(Show.start_time, Show.id)
+  return export('shows', format, shows)
+
+@app.route('/export/venues.<format>')
+@read_only
+def export_venues(format):
+  # With show filters, only venues having a matching show are exported.
+  venues = Venue.query.with_entities(*[getattr(Venue, c) for c in EXPORT_COLUMNS['venues']])
+  criteria = export_show_filters()
+  if criteria:
+    venues = venues.filter(Show.query.filter(Show.venue_id == Venue.id, *criteria).exists())
+  return export('venues', format, venues.order_by(Venue.id))
+
+@app.route('/export/artists.<format>')
+@read_only
+def export_artists(format):
+  artists = Artist.query.with_entities(*[getattr(Artist, c) for c in EXPORT_COLUMNS['artists']])
+  criteria = export_show_filters()
+  if criteria:
+    artists = artists.filter(Show.query.filter(Show.artist_id == Artist.id, *criteria).exists())
+  return export('artists', format, artists.order_by(Artist.id))
+
+@app.route('/_stats/db-pool')
+def db_pool_stats():
+  if not app.config.get('POOL_STATS_ENABLED'):
+    abort(404)
+  return jsonify(pool_stats(app, db))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -551,6 +1422,293 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per transaction.')
+@click.option('--copy', 'use_copy', is_flag=True, help='Load batches with COPY (Postgres only).')
+@click.option('--rejects', type=click.Path(dir_okay=False), help='Defaults to <file>.rejects.jsonl.')
+def import_data(kind, path, batch_size, use_copy, rejects):
+  """Bulk load venues, artists or shows from a CSV or JSONL file."""
+  checker = RowChecker(normalize_phone, timedelta(minutes=app.config['SHOW_DURATION_MINUTES']),
+                       geocoder.locate)
+  check, table, foreign_keys = {
+    'venues': (checker.venue, Venue.__table__, None),
+    'artists': (checker.artist, Artist.__table__, None),
+    'shows': (checker.show, Show.__table__,
+              {'artist_id': Artist.__table__, 'venue_id': Venue.__table__}),
+  }[kind]
+  rejects = rejects or rejects_path(path)
+  with open(rejects, 'w') as rejects_file:
+    importer = BulkImporter(db, table, check, batch_size=batch_size, use_copy=use_copy,
+                            rejects=rejects_file, foreign_keys=foreign_keys)
+    imported, rejected = importer.run(read_records(path))
+  if imported:
+    if kind == 'shows':
+      # Also bumps every venue's and artist's version.
+      recount_shows()
+    # Shows are counted on the venue and artist listings.
+    bump_collections(*(['venues', 'artists', 'shows'] if kind == 'shows' else [kind]))
+    on_commit(page_cache.invalidate, kind)
+    db.session.commit()
+  click.echo('Imported %d %s, rejected %d (see %s).' % (imported, kind, rejected, rejects))
+
+@app.cli.command('check-plans')
+@click.argument('urls', nargs=-1)
+@click.option('--min-rows', default=10000, show_default=True,
+              help='Tables with at least this many rows must not be scanned sequentially.')
+def check_plans_command(urls, min_rows):
+  """EXPLAIN the queries behind each page and fail on sequential scans.
+
+  Checks the listing, detail and search pages and their API mirrors unless
+  URLS are given. Run it against a seeded database."""
+  if db.engine.dialect.name != 'postgresql':
+    raise click.ClickException('check-plans needs a Postgres database.')
+  db.session.execute('ANALYZE')
+  db.session.commit()
+  if not urls:
+    venue = Venue.query.order_by(Venue.id).first()
+    artist = Artist.query.order_by(Artist.id).first()
+    if venue is None or artist is None:
+      raise click.ClickException('Seed the database first.')
+    urls = ['/venues', '/artists', '/shows',
+            '/venues/%d' % venue.id, '/artists/%d' % artist.id,
+            '/venues/search?search_term=%s' % venue.name.split()[0],
+            '/artists/search?search_term=%s' % artist.name.split()[0],
+            '/api/v1/venues', '/api/v1/artists', '/api/v1/shows',
+            '/api/v1/venues/%d' % venue.id, '/api/v1/artists/%d' % artist.id]
+  # Every request must reach the database.
+  page_cache.enabled = False
+  problems = check_plans(app, db.engine, urls, min_rows=min_rows)
+  for url, table, statement in problems:
+    click.echo('%s: sequential scan of %s in\n  %s\n' % (url, table, ' '.join(statement.split())))
+  if problems:
+    raise click.ClickException('%d queries scan large tables.' % len(problems))
+  click.echo('Checked %d pages, no sequential scans of large tables.' % len(urls))
+
+@app.cli.command('seed')
+@click.option('--venues', default=benchmark.DEFAULT_SCALE['venues'], show_default=True)
+@click.option('--artists', default=benchmark.DEFAULT_SCALE['artists'], show_default=True)
+@click.option('--shows', default=benchmark.DEFAULT_SCALE['shows'], show_default=True)
+@click.option('--seed', 'seed', default=42, show_default=True, help='Same seed, same rows.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per transaction.')
+@click.option('--anchor', type=click.DateTime(['%Y-%m-%d']),
+              help='Shows run from two years before to one year after this day. [default: today]')
+def seed_command(venues, artists, shows, seed, batch_size, anchor):
+  """Fill the database with synthetic venues, artists and shows.
+
+  The same seed, counts and anchor always give the same rows."""
+  anchor = anchor or datetime.combine(datetime.today().date(), datetime.min.time())
+  counts = benchmark.seed_database(db, {
+    'venues': Venue.__table__, 'artists': Artist.__table__, 'shows': Show.__table__,
+  }, {'venues': venues, 'artists': artists, 'shows': shows}, seed=seed, batch_size=batch_size,
+    anchor=anchor)
+  recount_shows()
+  bump_collections('venues', 'artists', 'shows')
+  db.session.commit()
+  click.echo('Seeded %(venues)d venues, %(artists)d artists and %(shows)d shows' % counts
+             + ' around %s.' % anchor.date())
+
+def benchmark_routes(seed):
+  # Ids and search terms are drawn from the seeded rows.
+  rng = random.Random(seed)
+  pick = lambda column: db.session.query(column).order_by(column).offset(
+    rng.randrange(max(db.session.query(column).count(), 1))).limit(1).scalar()
+  venue_id, artist_id = pick(Venue.id), pick(Artist.id)
+  if venue_id is None or artist_id is None:
+    raise click.ClickException('Seed the database first (flask seed).')
+  venue, artist = Venue.query.get(venue_id), Artist.query.get(artist_id)
+  venue_term, artist_term = venue.name.split()[1], artist.name.split()[1]
+  # New shows are booked after every show the venue or the artist already
+  # has, so a second run against the same database books free slots too.
+  last_end = db.session.query(db.func.max(Show.end_time)) \
+    .filter(db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id)).scalar()
+  start_time = max(datetime.now() + timedelta(days=400), last_end or datetime.min) \
+    .replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+  venue_form = {
+    'name': venue.name, 'city': venue.city, 'state': venue.state, 'address': venue.address,
+    'phone': venue.phone or '', 'genres': venue.genres, 'facebook_link': '', 'website': '',
+    'seeking_talent': 'True', 'seeking_description': ''}
+  artist_form = {
+    'name': artist.name, 'city': artist.city, 'state': artist.state,
+    'phone': artist.phone or '', 'genres': artist.genres, 'facebook_link': '', 'website': '',
+    'seeking_venue': 'True', 'seeking_description': ''}
+  db.session.close()
+  return [
+    ('index', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues_genre', 'GET', '/venues?' + urlencode({'genre': venue.genres[0]}), None),
+    ('venue', 'GET', '/venues/%d' % venue_id, None),
+    ('search_venues', 'POST', '/venues/search', {'search_term': venue_term}),
+    ('create_venue_form', 'GET', '/venues/create', None),
+    ('create_venue', 'POST', '/venues/create', venue_form),
+    ('edit_venue_form', 'GET', '/venues/%d/edit' % venue_id, None),
+    ('edit_venue', 'POST', '/venues/%d/edit' % venue_id, venue_form),
+    ('artists', 'GET', '/artists', None),
+    ('artists_genre', 'GET', '/artists?' + urlencode({'genre': artist.genres[0]}), None),
+    ('artist', 'GET', '/artists/%d' % artist_id, None),
+    ('search_artists', 'POST', '/artists/search', {'search_term': artist_term}),
+    ('create_artist_form', 'GET', '/artists/create', None),
+    ('create_artist', 'POST', '/artists/create', artist_form),
+    ('edit_artist_form', 'GET', '/artists/%d/edit' % artist_id, None),
+    ('edit_artist', 'POST', '/artists/%d/edit' % artist_id, artist_form),
+    ('shows', 'GET', '/shows', None),
+    ('create_show_form', 'GET', '/shows/create', None),
+    # One show after another, or all but the first would be double bookings.
+    ('create_show', 'POST', '/shows/create', lambda slots=count(): {
+      'venue_id': venue_id, 'artist_id': artist_id, 'duration': 60,
+      'start_time': str(start_time + timedelta(hours=next(slots)))}),
+    ('api_venues', 'GET', '/api/v1/venues', None),
+    ('api_venue_genres', 'GET', '/api/v1/venues/genres', None),
+    ('api_venue', 'GET', '/api/v1/venues/%d' % venue_id, None),
+    ('api_search_venues', 'GET', '/api/v1/venues/search?search_term=%s' % venue_term, None),
+    ('api_available_venues', 'GET', '/api/v1/venues/available?' + urlencode({
+      'city': venue.city, 'state': venue.state, 'start': start_time.isoformat(),
+      'end': (start_time + timedelta(hours=3)).isoformat()}), None),
+    ('api_venues_near', 'GET', '/api/v1/venues/near?' + urlencode({
+      'lat': venue.latitude, 'lon': venue.longitude, 'radius': 10}), None),
+    ('api_artists', 'GET', '/api/v1/artists', None),
+    ('api_artist', 'GET', '/api/v1/artists/%d' % artist_id, None),
+    ('api_search_artists', 'GET', '/api/v1/artists/search?search_term=%s' % artist_term, None),
+    ('api_shows', 'GET', '/api/v1/shows', None),
+    ('export_venue_shows', 'GET', '/export/shows.csv?venue_id=%d' % venue_id, None),
+    ('export_artist_venues', 'GET', '/export/venues.ndjson?artist_id=%d' % artist_id, None),
+  ]
+
+@app.cli.command('benchmark')
+@click.option('--repeat', default=20, show_default=True, help='Timed requests per route.')
+@click.option('--warmup', default=2, show_default=True, help='Untimed requests per route.')
+@click.option('--seed', 'seed', default=42, show_default=True, help='Picks the ids requested.')
+@click.option('--route', 'names', multiple=True, help='Only run the named routes.')
+@click.option('--page-cache', 'use_page_cache', is_flag=True, help='Leave the page cache on.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results as JSON.')
+@click.option('--compare', 'baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Results of an earlier run to compare against.')
+def benchmark_command(repeat, warmup, seed, names, use_page_cache, output, baseline):
+  """Time every route through the test client.
+
+  Create and edit routes write to the database; run against a seeded
+  database made for benchmarking (flask seed)."""
+  routes = [route for route in benchmark_routes(seed) if not names or route[0] in names]
+  # Time the views, not cache hits.
+  page_cache.enabled = use_page_cache
+  results, failures = benchmark.run_benchmarks(app, routes, repeat=repeat, warmup=warmup)
+  scale = dict((name, model.query.count()) for name, model in
+               (('venues', Venue), ('artists', Artist), ('shows', Show)))
+  report = benchmark.report(results, scale=scale, repeat=repeat, seed=seed,
+                            database=db.engine.dialect.name, page_cache=use_page_cache)
+  for name, method, url, data in routes:
+    result = results[name]
+    click.echo('%-22s %8.2f ms median %8.2f ms p95' % (name, result['median_ms'], result['p95_ms']))
+  if baseline:
+    click.echo()
+    for name, before, after, ratio in benchmark.compare(benchmark.load_report(baseline), report):
+      click.echo('%-22s %8.2f -> %8.2f ms  x%.2f' % (name, before, after, ratio))
+  if output:
+    with open(output, 'w') as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+  if failures:
+    raise click.ClickException('Errors from: ' + ', '.join(
+      name + (' (%s)' % results[name]['errors'][0] if results[name]['errors'] else '')
+      for name in failures))
+
+def read_paths(seed):
+  # The GET form of every @read_only route in benchmark_routes().
+  adapter = app.url_map.bind('localhost')
+  paths = []
+  for name, method, url, data in benchmark_routes(seed):
+    if method == 'POST' and name.startswith('search_'):
+      method, url = 'GET', url + '?' + urlencode(data)
+    if method != 'GET':
+      continue
+    endpoint, args = adapter.match(url.split('?')[0])
+    if getattr(app.view_functions[endpoint], 'read_only', False):
+      paths.append(url)
+  return paths
+
+@app.cli.command('load-test')
+@click.argument('url')
+@click.option('--concurrency', default=200, show_default=True, help='Concurrent clients.')
+@click.option('--duration', default=20.0, show_default=True, help='Seconds.')
+@click.option('--seed', 'seed', default=42, show_default=True, help='Picks the ids requested.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results as JSON.')
+@click.option('--compare', 'baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Results of an earlier run to compare against.')
+def load_test_command(url, concurrency, duration, seed, output, baseline):
+  """Measure throughput of the read pages served at URL.
+
+  Start the server under test first against the seeded database, with
+  one SECRET_KEY (or IMAGE_PROXY_KEY) for all workers, e.g.
+  `gunicorn -w 4 app:app` for threaded workers, then
+  `gunicorn -w 4 -k gevent serve_async:app` for the async mode, and run
+  the second test with --compare pointing at the first one's output."""
+  result = benchmark.load_test(url, read_paths(seed), concurrency=concurrency, duration=duration)
+  report = benchmark.report(result.pop('routes'), **result)
+  click.echo('%d requests in %.1f s, %.1f requests/s, %d errors' % (
+    report['requests'], report['duration_s'], report['throughput_rps'], sum(report['errors'].values())))
+  if report['latency']:
+    click.echo('latency %.2f ms median, %.2f ms p95' % (
+      report['latency']['median_ms'], report['latency']['p95_ms']))
+  if baseline:
+    old = benchmark.load_report(baseline)
+    click.echo('throughput %.1f -> %.1f requests/s  x%.2f' % (
+      old['throughput_rps'], report['throughput_rps'], report['throughput_rps'] / old['throughput_rps']))
+    for name, before, after, ratio in benchmark.compare(old, report):
+      click.echo('%-50s %8.2f -> %8.2f ms  x%.2f' % (name, before, after, ratio))
+  if output:
+    with open(output, 'w') as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+
+@app.cli.command('roll-over-shows')
+def roll_over_shows_command():
+  """Move shows that have started from the upcoming to the past counts."""
+  moved = roll_over_shows()
+  db.session.commit()
+  click.echo('Rolled over %d shows.' % moved)
+
+@app.cli.command('recount-shows')
+def recount_shows_command():
+  """Recompute every venue's and artist's show counts."""
+  recount_shows()
+  db.session.commit()
+  click.echo('Recounted shows.')
+
+@app.cli.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Also relocate venues that have a position.')
+def geocode_venues_command(everything):
+  """Place venues on the map from the geocoding table."""
+  located = unknown = 0
+  for city, state in db.session.query(Venue.city, Venue.state).distinct().all():
+    criteria = [Venue.city == city, Venue.state == state]
+    if not everything:
+      criteria.append(Venue.geocell.is_(None))
+    values = geocoder.locate(city, state)
+    moved = Venue.query.filter(*criteria).update(values, synchronize_session=False)
+    if values['geocell'] is None:
+      unknown += moved
+    else:
+      located += moved
+  bump_collections('venues')
+  db.session.commit()
+  click.echo('Located %d venues; %d are in places missing from %s.'
+             % (located, unknown, app.config['GEOCODING_TABLE']))
+
+@app.cli.command('build-assets')
+def build_assets_command():
+  """Bundle, minify and compress the static styles and scripts."""
+  manifest = assets.build()
+  for name, filename in sorted(manifest.items()):
+    sources = sum(os.path.getsize(os.path.join(app.static_folder, source))
+                  for source in assets.bundles[name])
+    path = os.path.join(assets.dir, filename)
+    click.echo('%s: %d files, %d bytes -> %s, %d bytes (gzip %d, brotli %d)' % (
+      name, len(assets.bundles[name]), sources, filename, os.path.getsize(path),
+      os.path.getsize(path + '.gz'), os.path.getsize(path + '.br')))
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,231 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+import threading
+
+import brotli
+from flask import abort, request, send_file, url_for
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#
+# The stylesheets and scripts of the page layout are concatenated and
+# minified into one file per bundle, named by the hash of its content, with
+# gzip and brotli copies next to it. `flask build-assets` writes them to
+# ASSETS_DIR at deploy time; an app that finds none builds them when it is
+# created, and fails to start if it cannot.
+# Templates link bundles through the asset_urls() global, so a changed file
+# gets a new URL and browsers and CDNs may keep every bundle for a year.
+# With ASSETS_BUNDLED off the source files are linked one by one instead.
+#----------------------------------------------------------------------------#
+
+# Files under the static folder, in page order.
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # Loaded in <head>: pages use moment before the body is parsed.
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Deferred, after jQuery.
+    'site.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+MANIFEST = 'manifest.json'
+BUNDLE_FILE = re.compile(r'^[\w.-]+\.[0-9a-f]{16}\.(css|js)$')
+
+CSS_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+CSS_COMMENTS = re.compile(r'(%s)|/\*(?!!).*?\*/' % CSS_STRING, re.S)
+# Strings and the license comments left are copied as they are.
+CSS_TOKENS = re.compile(r'''
+    (?P<url>url\(\s*(?P<quote>["']?)(?P<path>.*?)(?P=quote)\s*\))
+  | (?P<kept>%s|/\*.*?\*/)
+  | (?P<semicolon>;(?=\s*}))
+  | (?P<space>\s+)
+''' % CSS_STRING, re.S | re.X)
+# Whitespace next to these never matters. A space before ':' does, in
+# selectors like "a :hover".
+CSS_TIGHT = set('{};,>')
+
+
+def _absolute(path, base):
+    # url() paths are relative to the stylesheet, which the bundle is not.
+    if re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', path, re.I):
+        return path
+    return posixpath.normpath(posixpath.join(base, path)) + ('/' if path.endswith('/') else '')
+
+
+def minify_css(text, base):
+    """Strip comments and whitespace from a stylesheet served from the URL
+    path ``base``. License comments, /*! ... */, are kept."""
+    text = CSS_COMMENTS.sub(lambda match: match.group(1) or '', text)
+
+    def token(match):
+        if match.group('url'):
+            return 'url("%s")' % _absolute(match.group('path'), base)
+        if match.group('kept'):
+            return match.group('kept')
+        if match.group('semicolon'):
+            return ''
+        before, after = text[match.start() - 1:match.start()], text[match.end():match.end() + 1]
+        if not before or not after or before in CSS_TIGHT or after in CSS_TIGHT or before == ':':
+            return ''
+        return ' '
+    return CSS_TOKENS.sub(token, text).strip()
+
+
+def minify_js(text):
+    """Drop indentation, blank lines and whole-line // comments.
+
+    Scripts are not parsed, so nothing inside a line is touched; the
+    libraries are shipped minified already.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def bundle(static_folder, static_url_path, files):
+    """The minified content of one bundle of static files."""
+    parts = []
+    for name in files:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            text = f.read()
+        if name.endswith('.css'):
+            parts.append(minify_css(text, posixpath.join(static_url_path, posixpath.dirname(name))))
+        elif name.endswith('.min.js'):
+            parts.append(text.strip())
+        else:
+            parts.append(minify_js(text))
+    # A script that leaves out its last semicolon must not run into the next.
+    return ('\n' if files[0].endswith('.css') else ';\n').join(parts).encode('utf-8')
+
+
+def _write(path, data):
+    # Written aside and renamed: workers building at once never see part of
+    # a file, and all write the same bytes.
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def build(static_folder, static_url_path, out_dir, bundles=BUNDLES):
+    """Write every bundle and its compressed copies to ``out_dir``.
+
+    Returns the manifest, bundle name to file name, also written to
+    ``out_dir``/manifest.json. Files of earlier builds are left for pages
+    still linking them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for name, files in sorted(bundles.items()):
+        data = bundle(static_folder, static_url_path, files)
+        stem, extension = os.path.splitext(name)
+        filename = '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:16], extension)
+        path = os.path.join(out_dir, filename)
+        # The brotli copy is written last.
+        if not os.path.exists(path + '.br'):
+            _write(path, data)
+            _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+            _write(path + '.br', brotli.compress(data, quality=11))
+        manifest[name] = filename
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class Assets(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ASSETS_BUNDLED', True)
+        self.dir = app.config.get('ASSETS_DIR', os.path.join(app.root_path, 'assets'))
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.bundles = app.config.get('ASSET_BUNDLES', BUNDLES)
+        self.static_folder = app.static_folder
+        self.static_url_path = app.static_url_path
+        # In debug mode bundles are rebuilt when a source file changes.
+        self.debug = app.debug
+        self._manifest = None
+        self._built = 0
+        self.lock = threading.Lock()
+        app.extensions['assets'] = self
+        app.add_template_global(self.urls, 'asset_urls')
+        if self.enabled:
+            # Read now: an unwritable ASSETS_DIR or missing source file must
+            # stop the app, not fail every page.
+            try:
+                self.manifest
+            except OSError as e:
+                raise RuntimeError('cannot build asset bundles in %s: %s' % (self.dir, e))
+
+    def build(self):
+        with self.lock:
+            self._manifest = build(self.static_folder, self.static_url_path, self.dir, self.bundles)
+            self._built = os.stat(os.path.join(self.dir, MANIFEST)).st_mtime
+        return self._manifest
+
+    def _stale(self):
+        return any(os.stat(os.path.join(self.static_folder, name)).st_mtime > self._built
+                   for files in self.bundles.values() for name in files)
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                with open(os.path.join(self.dir, MANIFEST)) as f:
+                    manifest = json.load(f)
+                self._built = os.stat(os.path.join(self.dir, MANIFEST)).st_mtime
+            except (OSError, ValueError):
+                manifest = {}
+            if set(manifest) == set(self.bundles) and not self._stale():
+                self._manifest = manifest
+            else:
+                self.build()
+        elif self.debug and self._stale():
+            self.build()
+        return self._manifest
+
+    def urls(self, name):
+        """URLs to link for the bundle ``name``: the bundle itself, or its
+        source files when bundling is off."""
+        if not self.enabled:
+            return [url_for('static', filename=filename) for filename in self.bundles[name]]
+        return [url_for('asset', filename=self.manifest[name])]
+
+    def serve(self, filename):
+        # Bundles of earlier builds stay served for pages that link them.
+        path = os.path.join(self.dir, filename)
+        if not BUNDLE_FILE.match(filename) or not os.path.isfile(path):
+            abort(404)
+        etag, encoding = filename, None
+        for name, suffix in ENCODINGS:
+            if request.accept_encodings[name] and os.path.exists(path + suffix):
+                path, etag, encoding = path + suffix, filename + suffix, name
+                break
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], add_etags=False)
+        response.last_modified = None
+        response.set_etag(etag)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % self.max_age
+        return response.make_conditional(request)
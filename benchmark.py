@@ -0,0 +1,305 @@
+import http.client
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from flask import message_flashed
+
+from geo import Geocoder
+from importer import GENRES, BulkImporter
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#
+# `flask seed` fills a local database with synthetic venues, artists and
+# shows around an anchor date (today unless given); the same seed, scale and
+# anchor always produce the same rows. `flask benchmark` then times every
+# route through the test client and writes the
+# timings as JSON, so runs on different commits can be compared with
+# `flask benchmark --compare old.json`. Nothing touches the network.
+#----------------------------------------------------------------------------#
+
+# (city, state), most popular first; picks follow a Zipf distribution so a
+# few areas hold most venues, like real listings.
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Austin', 'TX'),
+    ('Nashville', 'TN'), ('San Francisco', 'CA'), ('Seattle', 'WA'), ('Atlanta', 'GA'),
+    ('New Orleans', 'LA'), ('Denver', 'CO'), ('Portland', 'OR'), ('Boston', 'MA'),
+    ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Miami', 'FL'),
+    ('Memphis', 'TN'), ('Houston', 'TX'), ('Phoenix', 'AZ'), ('Kansas City', 'MO'),
+    ('Baltimore', 'MD'), ('Cleveland', 'OH'), ('Pittsburgh', 'PA'), ('Salt Lake City', 'UT'),
+    ('Las Vegas', 'NV'), ('Omaha', 'NE'), ('Richmond', 'VA'), ('Providence', 'RI'),
+    ('Burlington', 'VT'), ('Anchorage', 'AK'),
+]
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Crimson',
+              'Lucky', 'Wild', 'Rusty', 'Neon', 'Hollow', 'Broken', 'Sunny', 'Iron']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Theater', 'Club', 'Ballroom',
+               'Cellar', 'Garden', 'Warehouse', 'Pavilion', 'Bar']
+ARTIST_NOUNS = ['Petals', 'Wolves', 'Echoes', 'Rivers', 'Engines', 'Saints', 'Ghosts',
+                'Machines', 'Horses', 'Lanterns', 'Mirrors', 'Sparrows']
+STREETS = ['Main St', 'Folsom St', 'Delancey St', 'Whiskey Row', 'Broadway', 'Market St']
+
+DEFAULT_SCALE = {'venues': 10000, 'artists': 100000, 'shows': 1000000}
+# Shows start at one of these hours and end when the next slot begins.
+EVENING_SLOTS = (17, 19, 21, 23)
+SHOW_LENGTH = timedelta(hours=2)
+
+
+def zipf_weights(n, s=1.0):
+    total = 0.0
+    weights = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        weights.append(total)
+    return weights
+
+
+class Generator(object):
+    """Deterministic synthetic rows for one seed."""
+
+    def __init__(self, seed=42, anchor=None):
+        self.rng = random.Random(seed)
+        # Shows are spread from two years before to one year after anchor.
+        self.anchor = anchor or datetime.combine(datetime.today().date(), datetime.min.time())
+        genres = sorted(GENRES)
+        self.rng.shuffle(genres)
+        self.genres = genres
+        self.genre_weights = zipf_weights(len(genres))
+        self.city_weights = zipf_weights(len(CITIES))
+        self.geocoder = Geocoder()
+
+    def name(self, nouns, number):
+        return '%s %s %d' % (self.rng.choice(ADJECTIVES), self.rng.choice(nouns), number)
+
+    def common(self, number, nouns):
+        city, state = self.rng.choices(CITIES, cum_weights=self.city_weights)[0]
+        genres = set(self.rng.choices(self.genres, cum_weights=self.genre_weights,
+                                      k=self.rng.randint(1, 3)))
+        digits = (self.rng.randint(200, 999), self.rng.randint(200, 999), self.rng.randint(0, 9999))
+        return {
+            'name': self.name(nouns, number),
+            'city': city,
+            'state': state,
+            'phone': '%03d-%03d-%04d' % digits,
+            'phone_e164': '+1%03d%03d%04d' % digits,
+            'website': None,
+            'image_link': 'https://images.example.com/%d.jpg' % number,
+            'facebook_link': None,
+            'genres': sorted(genres),
+            'seeking_description': None,
+        }
+
+    def venues(self, count):
+        for number in range(1, count + 1):
+            values = self.common(number, VENUE_NOUNS)
+            values['address'] = '%d %s' % (self.rng.randint(1, 9999), self.rng.choice(STREETS))
+            values['seeking_talent'] = self.rng.random() < 0.3
+            # Placed like the app places them: on their city.
+            values.update(self.geocoder.locate(values['city'], values['state']))
+            yield number, values
+
+    def artists(self, count):
+        for number in range(1, count + 1):
+            values = self.common(number, ARTIST_NOUNS)
+            values['seeking_venue'] = self.rng.random() < 0.3
+            yield number, values
+
+    def shows(self, count, venue_ids, artist_ids):
+        # Popular venues and artists get most of the bookings, up to one show
+        # per evening slot each: a pick that would double-book is drawn again.
+        venue_weights = zipf_weights(len(venue_ids), 0.8)
+        artist_weights = zipf_weights(len(artist_ids), 0.8)
+        slots = 3 * 365 * len(EVENING_SLOTS)
+        start = self.anchor - timedelta(days=2 * 365)
+        booked = set()
+        for number in range(1, count + 1):
+            while True:
+                venue_id = self.rng.choices(venue_ids, cum_weights=venue_weights)[0]
+                artist_id = self.rng.choices(artist_ids, cum_weights=artist_weights)[0]
+                slot = self.rng.randrange(slots)
+                if ('v', venue_id, slot) not in booked and ('a', artist_id, slot) not in booked:
+                    break
+            booked.add(('v', venue_id, slot))
+            booked.add(('a', artist_id, slot))
+            day, evening = divmod(slot, len(EVENING_SLOTS))
+            start_time = start + timedelta(days=day, hours=EVENING_SLOTS[evening])
+            yield number, {
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'end_time': start_time + SHOW_LENGTH,
+            }
+
+
+def seed_database(db, tables, scale=None, seed=42, batch_size=5000, anchor=None):
+    """Insert synthetic rows into ``tables`` ({'venues': Venue.__table__, ...})
+    through the bulk importer. Returns the number of rows per table."""
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    generator = Generator(seed, anchor)
+    accept = lambda record, errors: record
+
+    def load(kind, records):
+        importer = BulkImporter(db, tables[kind], accept, batch_size=batch_size, use_copy=True)
+        imported, rejected = importer.run(records)
+        return imported
+
+    counts = {
+        'venues': load('venues', generator.venues(scale['venues'])),
+        'artists': load('artists', generator.artists(scale['artists'])),
+    }
+    ids = lambda kind: [id for id, in db.session.execute(
+        tables[kind].select().with_only_columns([tables[kind].c.id]).order_by(tables[kind].c.id))]
+    counts['shows'] = load('shows', generator.shows(scale['shows'], ids('venues'), ids('artists')))
+    return counts
+
+
+#  Timing
+#  ----------------------------------------------------------------
+
+def time_request(client, method, url, data=None):
+    # Callable data is called for each request, e.g. for a fresh show time.
+    if callable(data):
+        data = data()
+    start = time.perf_counter()
+    response = client.open(url, method=method, data=data)
+    # Streamed bodies are produced while being read.
+    response.get_data()
+    return time.perf_counter() - start, response.status_code
+
+
+def summarize(timings):
+    ms = sorted(1000.0 * t for t in timings)
+    return {
+        'runs': len(ms),
+        'mean_ms': statistics.mean(ms),
+        'median_ms': statistics.median(ms),
+        'p95_ms': ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))],
+        'min_ms': ms[0],
+        'max_ms': ms[-1],
+        'stdev_ms': statistics.stdev(ms) if len(ms) > 1 else 0.0,
+    }
+
+
+def run_benchmarks(app, routes, repeat=20, warmup=2):
+    """Time each (name, method, url, data) in ``routes``. Returns a dict of
+    summaries by name and a list of routes that failed.
+
+    A route fails when it answers with an error status, or when it flashes
+    a message in the 'error' category: the write handlers answer 200 or a
+    redirect either way, and report a write that did not go through that
+    way.
+    """
+    client = app.test_client()
+    results = {}
+    failures = []
+    errors = []
+
+    def flashed(sender, message, category):
+        if category == 'error':
+            errors.append(message)
+
+    message_flashed.connect(flashed, app)
+    try:
+        for name, method, url, data in routes:
+            del errors[:]
+            for i in range(warmup):
+                time_request(client, method, url, data)
+            timings = []
+            statuses = set()
+            for i in range(repeat):
+                seconds, status = time_request(client, method, url, data)
+                timings.append(seconds)
+                statuses.add(status)
+            results[name] = dict(summarize(timings), method=method, url=url,
+                                 statuses=sorted(statuses), errors=sorted(set(errors)))
+            if errors or any(status >= 400 for status in statuses):
+                failures.append(name)
+    finally:
+        message_flashed.disconnect(flashed, app)
+    return results, failures
+
+
+def load_test(base_url, paths, concurrency=100, duration=20.0):
+    """Request ``paths`` in turn from ``concurrency`` keep-alive clients
+    against a running server for ``duration`` seconds."""
+    url = urlsplit(base_url)
+    prefix = url.path.rstrip('/')
+    deadline = time.perf_counter() + duration
+    samples = []
+    lock = threading.Lock()
+
+    def client(offset):
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+        own = []
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                connection.request('GET', prefix + path)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = None
+            own.append((path, time.perf_counter() - start, status))
+        connection.close()
+        with lock:
+            samples.extend(own)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    ok = [(path, seconds) for path, seconds, status in samples if status is not None and status < 400]
+    errors = Counter(str(status) for path, seconds, status in samples
+                     if status is None or status >= 400)
+    return {
+        'url': base_url,
+        'concurrency': concurrency,
+        'duration_s': elapsed,
+        'requests': len(samples),
+        'errors': dict(errors),
+        'throughput_rps': len(ok) / elapsed,
+        'latency': summarize([seconds for path, seconds in ok]) if ok else None,
+        'routes': dict((path, summarize([s for p, s in ok if p == path]))
+                       for path in paths if any(p == path for p, s in ok)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, **info):
+    return dict(info, commit=git_commit(), created=datetime.utcnow().isoformat() + 'Z',
+                python=platform.python_version(), routes=results)
+
+
+def compare(old, new):
+    """Yield (name, old median, new median, ratio) for routes in both reports."""
+    for name in sorted(set(old['routes']) & set(new['routes'])):
+        before = old['routes'][name]['median_ms']
+        after = new['routes'][name]['median_ms']
+        yield name, before, after, after / before if before else float('inf')
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, request, session
+
+#----------------------------------------------------------------------------#
+# Rendered page cache.
+#
+# Cached pages are tagged with the entities they display ('venue:3',
+# 'artist:7') and the listings they belong to ('venues', 'shows'). Write
+# handlers invalidate by tag, so a change evicts exactly the pages that
+# showed the changed rows and nothing else.
+#----------------------------------------------------------------------------#
+
+
+class CacheBackend(object):
+    """Storage interface for PageCache.
+
+    The default LRUCache lives in the worker process. A shared store (Redis,
+    memcached with a tag table, ...) implements the same three methods so
+    that an invalidation in one worker is seen by all of them.
+    """
+
+    def get(self, key):
+        """Return the value stored under ``key``, or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, size, tags=(), ttl=None):
+        """Store ``value`` (``size`` bytes) under ``key`` for ``ttl`` seconds
+        and remember it under every tag in ``tags``."""
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        """Drop every value stored under any of ``tags``."""
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """In-process cache bounded by total size in bytes, with per-entry TTL."""
+
+    def __init__(self, max_bytes, default_ttl=None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, size, value, tags = entry
+            if expires is not None and expires <= time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size, tags=(), ttl=None):
+        if size > self.max_bytes:
+            return
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (expires, size, value, frozenset(tags))
+            self.size += size
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[1]
+        for tag in entry[3]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class PageCache(object):
+
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)
+        if self.backend is None:
+            self.backend = LRUCache(app.config.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+                                    default_ttl=self.ttl)
+        app.extensions['page_cache'] = self
+
+    def tag(self, *tags):
+        # Called from a cached view for entities only known after querying,
+        # e.g. the artists listed on a venue page.
+        g.setdefault('page_cache_tags', set()).update(tags)
+
+    def invalidate(self, *tags):
+        self.backend.invalidate(tags)
+
+    def cached(self, *tags):
+        """Cache the decorated GET view under its full path.
+
+        ``tags`` are format strings filled in from the view arguments, e.g.
+        ``'venue:{venue_id}'``. Under @conditional the key also holds the
+        resource version, so a page written by another worker is never
+        served from this worker's copy.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # Pages carrying flashed messages are specific to one visitor.
+                if not self.enabled or request.method != 'GET' or '_flashes' in session:
+                    return view(**kwargs)
+                key = 'page:%s:%s' % (request.full_path, g.get('resource_version', ''))
+                cached = self.backend.get(key)
+                if cached is not None:
+                    body, status, mimetype = cached
+                    response = Response(body, status=status, mimetype=mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+                response = self.app.make_response(view(**kwargs))
+                if response.status_code == 200 and not response.direct_passthrough \
+                        and '_flashes' not in session:
+                    body = response.get_data()
+                    page_tags = set(tag.format(**kwargs) for tag in tags)
+                    page_tags.update(g.pop('page_cache_tags', ()))
+                    self.backend.set(key, (body, response.status_code, response.mimetype),
+                                     len(body), tags=page_tags, ttl=self.ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
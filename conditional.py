@@ -0,0 +1,70 @@
+import hashlib
+from collections import namedtuple
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, g, request, session
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#
+# A validator function returns a Version: a small, cheap-to-query tag that
+# changes whenever the resource does (row version counters, see DataVersion
+# in app.py) and, optionally, the resource's modification time. The ETag is
+# derived from the tag and the request URL, so a matching If-None-Match, or
+# an If-Modified-Since no older than the modification time, is answered with
+# 304 after that one query, without running the view.
+#----------------------------------------------------------------------------#
+
+Version = namedtuple('Version', ['tag', 'last_modified'])
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _utc(value):
+    # Naive datetimes are UTC; HTTP dates have one second resolution.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def not_modified(etag, last_modified):
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since.
+        return etag in request.if_none_match
+    since = request.if_modified_since
+    return last_modified is not None and since is not None and _utc(since) >= last_modified
+
+
+def conditional(validator):
+    """Decorate a GET view with a strong ETag, and Last-Modified when known,
+    computed by ``validator(**view_args)``. The validator should abort(404)
+    for missing resources."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # Pages carrying flashed messages are specific to one visitor.
+            if '_flashes' in session:
+                return view(**kwargs)
+            version = validator(**kwargs)
+            # Cached pages are stored per version (see PageCache.cached), so
+            # a worker that missed an invalidation never serves an old body
+            # under the new ETag.
+            g.resource_version = version.tag
+            etag = make_etag(request.full_path, version.tag)
+            last_modified = _utc(version.last_modified) if version.last_modified else None
+            if not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(**kwargs))
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Clients and intermediaries may keep the response but must
+            # revalidate it before every reuse.
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
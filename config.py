@@ -1,5 +1,6 @@
+import json
 import os
-SECRET_KEY = os.urandom(32)
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -10,4 +11,90 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://obrien@localhost:5432/fyyurappdb'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://obrien@localhost:5432/fyyurappdb')
+
+# Connection pool, per worker process. Keep
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below Postgres' max_connections.
+# SQLite manages its own connections and takes none of these.
+if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    }
+
+# Read-only views are served by these replicas when any are configured, e.g.
+# DATABASE_REPLICA_URLS='postgresql://replica1/fyyurappdb,postgresql://replica2/fyyurappdb'.
+# REPLICA_SELECTION is 'round_robin' or 'least_loaded'.
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+REPLICA_SELECTION = os.environ.get('DB_REPLICA_SELECTION', 'round_robin')
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Statement timeout in milliseconds for every transaction a request begins,
+# with per-endpoint overrides, e.g.
+# DB_STATEMENT_TIMEOUTS='{"search_venues": 1000, "search_artists": 1000}'.
+# 0 disables the timeout.
+STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 5000))
+STATEMENT_TIMEOUTS = json.loads(os.environ.get('DB_STATEMENT_TIMEOUTS', '{}'))
+
+# Serve pool checkout/saturation figures as JSON at /_stats/db-pool.
+POOL_STATS_ENABLED = os.environ.get('DB_POOL_STATS', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+# Listing and search pages are paginated by keyset; ?per_page= may override
+# PAGE_SIZE up to MAX_PAGE_SIZE.
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Rendered pages are cached per worker and evicted by the write handlers.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TTL = 300
+PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Offline table of city positions used to place venues (see geo.py). Run
+# `flask geocode-venues --all` after changing it: /api/v1/venues/near only
+# finds venues on the positions of the current table.
+# It searches NEAR_RADIUS_KM around a point unless given a ?radius= of at
+# most NEAR_MAX_RADIUS_KM.
+GEOCODING_TABLE = os.environ.get('GEOCODING_TABLE', os.path.join(basedir, 'data', 'places.csv'))
+NEAR_RADIUS_KM = 25
+NEAR_MAX_RADIUS_KM = 500
+
+# Page images are served resized through /images/<size> (see images.py),
+# fetched once and kept on disk up to IMAGE_CACHE_MAX_BYTES. Image links are
+# signed with IMAGE_PROXY_KEY, or the SECRET_KEY of the environment, which
+# must be the same in every worker and across restarts. Without one the
+# proxy is off and pages link the original images; turning it on without
+# one stops the app from starting.
+IMAGE_PROXY_KEY = os.environ.get('IMAGE_PROXY_KEY') or os.environ.get('SECRET_KEY', '')
+IMAGE_PROXY_ENABLED = os.environ.get('IMAGE_PROXY_ENABLED', str(bool(IMAGE_PROXY_KEY))).lower() in ('1', 'true', 'yes')
+IMAGE_SIZES = {'tile': (300, 300), 'large': (800, 800)}
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(basedir, 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_FETCH_TIMEOUT = 5
+# Seconds before a source that could not be fetched is tried again.
+IMAGE_RETRY_AFTER = 300
+IMAGE_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+
+# The layout's styles and scripts are served as minified, compressed bundles
+# (see assets.py), built into ASSETS_DIR by `flask build-assets` or when the
+# app starts. Turn ASSETS_BUNDLED off to link the files in static/ instead.
+ASSETS_BUNDLED = os.environ.get('ASSETS_BUNDLED', 'true').lower() in ('1', 'true', 'yes')
+ASSETS_DIR = os.environ.get('ASSETS_DIR', os.path.join(basedir, 'assets'))
+
+# Length of a show booking when the form or an imported row gives none.
+SHOW_DURATION_MINUTES = 120
+
+# Bulk DELETE/PATCH requests on /api/v1/venues and /api/v1/artists take
+# at most BULK_MAX_IDS ids, sent to the database BULK_CHUNK_SIZE at a time
+# (three statements per chunk).
+BULK_MAX_IDS = 100000
+BULK_CHUNK_SIZE = 1000
+
+# Per-request SQL/template/filter timings as a Server-Timing header and, on
+# HTML pages, a panel (see profiling.py). Statements repeated more than
+# PROFILE_REPEAT_THRESHOLD times in one request are logged.
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '').lower() in ('1', 'true', 'yes')
+PROFILE_REPEAT_THRESHOLD = 5
+PROFILE_PANEL = True
@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+#----------------------------------------------------------------------------#
+# Streaming CSV/NDJSON exports.
+#
+# Rows come from a query run with yield_per(), which on Postgres reads
+# through a server-side cursor, and are encoded and sent in chunks as they
+# arrive, so memory use does not depend on the size of the table. The CSV
+# layout matches what `flask import-data` reads back.
+#----------------------------------------------------------------------------#
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+ROWS_PER_CHUNK = 500
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ';'.join(value)
+    return value
+
+
+def encode_rows(rows, columns, format):
+    """Yield text chunks of ``rows`` encoded as ``format``."""
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([_csv_value(getattr(row, c)) for c in columns])
+    else:
+        write = lambda row: buffer.write(json.dumps(
+            dict((c, _json_value(getattr(row, c))) for c in columns)) + '\n')
+    count = 0
+    for row in rows:
+        write(row)
+        count += 1
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(query, columns, format, filename, compress=False, batch_size=1000):
+    rows = query.yield_per(batch_size)
+    chunks = encode_rows(rows, columns, format)
+    headers = {'Content-Disposition': 'attachment; filename="%s.%s"' % (filename, format)}
+    if compress:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+    return Response(stream_with_context(chunks), mimetype=FORMATS[format], headers=headers)
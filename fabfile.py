@@ -4,11 +4,27 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
+# Smoke tests run against this scratch database, created and dropped for
+# each run, never against the configured one.
+TEST_DATABASE = "fyyur_smoke_test"
+
+
 def test():
+    flask = "DATABASE_URL=postgresql:///{} FLASK_APP=app.py flask ".format(TEST_DATABASE)
     with settings(warn_only=True):
+        local("dropdb --if-exists {0} && createdb {0}".format(TEST_DATABASE))
+        # Requests every route once against a small seeded database; fails
+        # if any of them answers with an error or a write does not go
+        # through.
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            " && ".join([
+                flask + "db upgrade",
+                flask + "seed --venues 200 --artists 1000 --shows 5000",
+                flask + "benchmark --repeat 1 --warmup 0",
+            ]),
+            capture=True,
         )
+        local("dropdb --if-exists {}".format(TEST_DATABASE))
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
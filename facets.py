@@ -0,0 +1,32 @@
+from collections import namedtuple
+
+#----------------------------------------------------------------------------#
+# Genre facets.
+#
+# Listings and searches narrow to one genre (?genre=) with an array
+# containment test, genres @> ARRAY[genre], which the GIN indexes on the
+# genres columns answer. On Postgres the number of venues and artists per
+# genre is kept in the genre_count table, per city and state and in total
+# (city and state ''), by statement-level triggers on venue and artist (see
+# migration f8b3d6e2a1c9). Every write path updates it: the forms, the bulk
+# API and COPY imports. A facet list is then one index lookup of a
+# few rows, whatever the size of the tables.
+#----------------------------------------------------------------------------#
+
+Facet = namedtuple('Facet', ['genre', 'count'])
+
+
+class TableFacets(object):
+    """Facet counts read from the trigger-maintained ``table``."""
+
+    def __init__(self, session, table):
+        self.session = session
+        self.table = table
+
+    def counts(self, model, city=None, state=None):
+        c = self.table.c
+        rows = self.session.query(c.genre, c.count) \
+            .filter(c.kind == model.__tablename__, c.city == (city or ''),
+                    c.state == (state or ''), c.count > 0) \
+            .order_by(c.genre)
+        return [Facet(genre, count) for genre, count in rows]
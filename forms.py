@@ -1,22 +1,13 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Regexp, NumberRange
 import re
 
-class validPhone:
-    regex = r'\w{3}-\w{3}-\w{4}'
-    msgFormat = 'Not a valid phone number. Phone numbers must be 333-222-1111.'
-    msgLength = 'Not a valid phone number. Phone numbers should be 10 digits with dashes (-).'
+from phones import phone_number
 
-    def __call__(self, form, field, message = None):
-        match = re.match(regex, str(field.data))
-        if (match is None and str(field.data) != ''):
-            message = msgFormat
-            raise ValidationError(message)
-        elif len(str(field.data)) > 12:
-            message = msgLength
-            raise ValidationError(message)
+# Bounds of a show's length in minutes, also checked by the new-show handler.
+SHOW_MINUTES = NumberRange(min=1, max=24 * 60, message='Duration must be between 1 and 1440 minutes.')
 
 class ShowForm(Form):
     artist_id = StringField('artist_id')
@@ -29,6 +20,14 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
+    # minutes; the venue and the artist are booked from start_time until
+    # start_time + duration
+    duration = IntegerField(
+        'duration',
+        validators=[DataRequired(), SHOW_MINUTES],
+        default=120
+    )
+
 class VenueForm(Form):
     name = StringField('name', validators=[DataRequired()])
 
@@ -92,7 +91,7 @@ class VenueForm(Form):
     )
     address = StringField('address', validators=[DataRequired()])
 
-    phone = StringField('phone', validators=[validPhone()])
+    phone = StringField('phone', validators=[phone_number])
 
     image_link = StringField('image_link', validators=[URL()])
 
@@ -198,7 +197,7 @@ class ArtistForm(Form):
     phone = StringField(
         # TODO implement validation logic for state
         # 'phone', validators=[Regexp(regex="\w{3}-\w{3}-\w{4}", message="Not a valid phone number. Phone numbers must be 333-222-1111.")])
-        'phone', validators=[validPhone()])
+        'phone', validators=[phone_number])
 
     image_link = StringField('image_link')
     
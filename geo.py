@@ -0,0 +1,110 @@
+import bisect
+import csv
+import math
+import os
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#
+# Venues are placed on the map by city and state, from an offline table of
+# places (GEOCODING_TABLE, a CSV of city,state,latitude,longitude), so no
+# request ever waits on a geocoding service. Positions are city-level: every
+# venue of a city sits on the same point, and a venue whose city is not in
+# the table has no position. Each located venue also stores a geocell, its
+# position as a 52-bit Z-order code, the integer form of a geohash.
+#
+# A near search therefore looks for places, not venues: the table's places
+# around the point, found by latitude band in a sorted list, and then the
+# venues of those places, one indexed lookup per place in one statement.
+#----------------------------------------------------------------------------#
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'places.csv')
+
+AXIS_BITS = 26
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+NOWHERE = {'latitude': None, 'longitude': None, 'geocell': None}
+
+
+def _grid(value, low, high, level):
+    # Index of the cell holding value among 2**level cells across [low, high].
+    cells = 1 << level
+    return max(0, min(int((value - low) / (high - low) * cells), cells - 1))
+
+
+def _interleave(x, y, level):
+    # Longitude bit first, like a geohash.
+    code = 0
+    for bit in range(level - 1, -1, -1):
+        code = (code << 2) | (((x >> bit) & 1) << 1) | ((y >> bit) & 1)
+    return code
+
+
+def geocell(latitude, longitude):
+    return _interleave(_grid(longitude, -180.0, 180.0, AXIS_BITS),
+                       _grid(latitude, -90.0, 90.0, AXIS_BITS), AXIS_BITS)
+
+
+class Geocoder(object):
+    """Looks places up in a CSV table, read on first use."""
+
+    def __init__(self, path=DEFAULT_TABLE):
+        self.path = path
+        self._places = None
+        self._positions = None
+
+    @property
+    def places(self):
+        if self._places is None:
+            with open(self.path, newline='') as f:
+                self._places = dict(
+                    ((row['city'].strip().lower(), row['state'].strip().upper()),
+                     (float(row['latitude']), float(row['longitude'])))
+                    for row in csv.DictReader(f))
+        return self._places
+
+    @property
+    def positions(self):
+        # Every distinct position, sorted by latitude.
+        if self._positions is None:
+            self._positions = sorted(set(self.places.values()))
+        return self._positions
+
+    def position(self, city, state):
+        """(latitude, longitude) of a city, or None when the table lacks it."""
+        return self.places.get(((city or '').strip().lower(), (state or '').strip().upper()))
+
+    def locate(self, city, state):
+        """Column values placing a venue in ``city``; all None if unknown."""
+        position = self.position(city, state)
+        if position is None:
+            return dict(NOWHERE)
+        latitude, longitude = position
+        return {'latitude': latitude, 'longitude': longitude, 'geocell': geocell(latitude, longitude)}
+
+    def nearby(self, latitude, longitude, radius_km, box=None):
+        """Places within ``radius_km`` of a point, and inside ``box``
+        (south, west, north, east) if one is given, as a sorted list of
+        (distance, geocells): places at the same distance share an entry.
+
+        Distances are squared, in degrees, on a flat projection around the
+        point, well within a kilometre of the great-circle distance at 500 km.
+        """
+        scale = math.cos(math.radians(latitude))
+        limit = (radius_km / KM_PER_DEGREE) ** 2
+        south, north = latitude - radius_km / KM_PER_DEGREE, latitude + radius_km / KM_PER_DEGREE
+        if box is not None:
+            south, north = max(south, box[0]), min(north, box[2])
+        positions = self.positions
+        # Only the band of latitudes the circle spans is looked at.
+        start = bisect.bisect_left(positions, (south, -math.inf))
+        end = bisect.bisect_right(positions, (north, math.inf))
+        groups = {}
+        for lat, lon in positions[start:end]:
+            if box is not None and not box[1] <= lon <= box[3]:
+                continue
+            distance = (lat - latitude) ** 2 + ((lon - longitude) * scale) ** 2
+            if distance <= limit:
+                groups.setdefault(distance, set()).add(geocell(lat, lon))
+        return sorted((distance, sorted(cells)) for distance, cells in groups.items())
@@ -0,0 +1,291 @@
+import hashlib
+import hmac
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+from functools import partial
+from urllib.parse import urlsplit
+from urllib.request import (HTTPHandler, HTTPRedirectHandler, HTTPSHandler, ProxyHandler,
+                            Request, build_opener)
+
+from flask import abort, redirect, request, send_file, url_for
+from PIL import Image, ImageOps
+
+from cache import LRUCache
+
+#----------------------------------------------------------------------------#
+# Image proxy.
+#
+# Pages link images through /images/<size>?src=...&sig=... instead of
+# hot-linking image_link. The first request for a source fetches it once
+# and stores a copy resized to every size in IMAGE_SIZES under
+# IMAGE_CACHE_DIR, from where every worker serves later requests. Files
+# are named by the hash of their content and the least recently served are
+# evicted once the cache outgrows IMAGE_CACHE_MAX_BYTES. Browsers and CDNs
+# may keep a response for a year: a new image comes with a new image_link,
+# and so a new URL. The signature keeps the proxy to links the app renders.
+#----------------------------------------------------------------------------#
+
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+
+class FetchError(Exception):
+    pass
+
+
+def _check_url(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError('not an http(s) URL: %s' % url)
+
+
+def _public_address(host, port):
+    # image_link is user input; never fetch from the app's own network. The
+    # connection goes to the address checked here: resolving the name again
+    # to connect could give another answer (DNS rebinding).
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise FetchError('cannot resolve %s: %s' % (host, e))
+    for address in addresses:
+        if not ipaddress.ip_address(address[4][0].split('%')[0]).is_global:
+            raise FetchError('%s is not a public address' % host)
+    return addresses[0][4][0]
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+
+    def connect(self):
+        self.sock = socket.create_connection((_public_address(self.host, self.port), self.port),
+                                             self.timeout)
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+
+    def connect(self):
+        sock = socket.create_connection((_public_address(self.host, self.port), self.port),
+                                        self.timeout)
+        # The certificate is still checked against the host name.
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class _PublicHTTPHandler(HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _PublicRedirects(HTTPRedirectHandler):
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_url(newurl)
+        return HTTPRedirectHandler.redirect_request(self, req, fp, code, msg, headers, newurl)
+
+
+def fetch_url(url, timeout=5, max_bytes=10 * 1024 * 1024):
+    """The default fetcher: the body of an http(s) URL on a public host.
+
+    A fetcher takes a URL and returns bytes or raises FetchError; tests
+    pass their own to ImageProxy instead of going to the network.
+    """
+    _check_url(url)
+    # No proxies: the address checks apply to the image host itself.
+    opener = build_opener(ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler,
+                          _PublicRedirects)
+    try:
+        with opener.open(Request(url, headers={'User-Agent': 'fyyur-image-proxy'}),
+                         timeout=timeout) as response:
+            body = response.read(max_bytes + 1)
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        raise FetchError('cannot fetch %s: %s' % (url, e))
+    if len(body) > max_bytes:
+        raise FetchError('%s is larger than %d bytes' % (url, max_bytes))
+    return body
+
+
+def resize(data, box):
+    """Return (bytes, extension) of the image in ``data`` scaled down to fit
+    ``box`` (width, height). Images with transparency stay PNG."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise FetchError('not an image: %s' % e)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(box, Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image, format, options = image.convert('RGBA'), 'PNG', {'optimize': True}
+    else:
+        image, format, options = image.convert('RGB'), 'JPEG', {'quality': 85, 'optimize': True,
+                                                               'progressive': True}
+    out = io.BytesIO()
+    image.save(out, format, **options)
+    return out.getvalue(), EXTENSIONS[format]
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskLRU(object):
+    """Files under ``root`` named by the hash of their content, bounded to
+    ``max_bytes`` in total.
+
+    keys/<hash of key> holds the name of the file stored for a key, so equal
+    images stored under several keys share one file. A file's modification
+    time is when it was last served.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+
+    def _key_path(self, key):
+        return os.path.join(self.root, 'keys', _sha256(key.encode('utf-8')))
+
+    def _file_path(self, name):
+        return os.path.join(self.root, 'files', name[:2], name)
+
+    def get(self, key):
+        """Path of the file stored under ``key``, or None."""
+        try:
+            with open(self._key_path(key)) as f:
+                path = self._file_path(f.read().strip())
+            os.utime(path)
+        except OSError:
+            # Never stored, or evicted since.
+            return None
+        return path
+
+    def set(self, key, data, extension=''):
+        path = self._file_path(_sha256(data) + extension)
+        if not os.path.exists(path):
+            self._write(path, data)
+            self._grew(len(data))
+        self._write(self._key_path(key), os.path.basename(path).encode('ascii'))
+        return path
+
+    def _write(self, path, data):
+        # Written aside and renamed, so readers never see part of a file.
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def _files(self):
+        root = os.path.join(self.root, 'files')
+        for directory in os.scandir(root) if os.path.isdir(root) else ():
+            for entry in os.scandir(directory.path):
+                stat = entry.stat()
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    def _grew(self, size):
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for mtime, size, path in self._files())
+            else:
+                self.size += size
+            if self.size > self.max_bytes:
+                self.size = self._evict()
+
+    def _evict(self):
+        # Other workers share the directory, so the real total is counted
+        # again here. Going down to 90% leaves room for the next writes.
+        files = sorted(self._files())
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in files:
+            if total <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+
+class ImageProxy(object):
+
+    def __init__(self, app=None, fetch=None):
+        self.fetch = fetch
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('IMAGE_PROXY_ENABLED', True)
+        self.sizes = app.config.get('IMAGE_SIZES', {'tile': (300, 300)})
+        self.max_age = app.config.get('IMAGE_MAX_AGE', 365 * 24 * 3600)
+        key = app.config.get('IMAGE_PROXY_KEY') or ''
+        if self.enabled and not key:
+            # A key of this process alone would make other workers, and this
+            # one after a restart, reject the links it renders.
+            raise RuntimeError('IMAGE_PROXY_ENABLED needs an IMAGE_PROXY_KEY shared by every worker')
+        self.key = key.encode('utf-8') if isinstance(key, str) else key
+        self.cache = DiskLRU(app.config.get('IMAGE_CACHE_DIR', os.path.join(app.root_path, 'image_cache')),
+                             app.config.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+        if self.fetch is None:
+            self.fetch = partial(fetch_url, timeout=app.config.get('IMAGE_FETCH_TIMEOUT', 5),
+                                 max_bytes=app.config.get('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024))
+        # Requests for one source wait for a single fetch.
+        self.locks = [threading.Lock() for i in range(64)]
+        # Sources that could not be fetched are sent to the browser as they
+        # are for IMAGE_RETRY_AFTER seconds, instead of being fetched again
+        # by every page view.
+        self.failed = LRUCache(app.config.get('IMAGE_FAILURES_KEPT', 10000),
+                               default_ttl=app.config.get('IMAGE_RETRY_AFTER', 300))
+        self.logger = app.logger
+        app.extensions['images'] = self
+        app.add_template_filter(self.url, 'thumbnail')
+
+    def signature(self, size, src):
+        return hmac.new(self.key, ('%s\n%s' % (size, src)).encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+    def url(self, src, size='tile'):
+        """The proxied URL of ``src`` at one of IMAGE_SIZES."""
+        if not src or not self.enabled:
+            return src
+        return url_for('image', size=size, src=src, sig=self.signature(size, src))
+
+    def serve(self, size, src, signature):
+        if size not in self.sizes or not hmac.compare_digest(signature, self.signature(size, src)):
+            abort(404)
+        path = self.cache.get('%s\n%s' % (size, src)) or self.render(size, src)
+        if path is None:
+            # Let the browser try the original.
+            return redirect(src)
+        response = send_file(path, add_etags=False)
+        response.last_modified = None
+        response.set_etag(os.path.splitext(os.path.basename(path))[0])
+        response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % self.max_age
+        return response.make_conditional(request)
+
+    def render(self, size, src):
+        if self.failed.get(src):
+            return None
+        with self.locks[hash(src) % len(self.locks)]:
+            path = self.cache.get('%s\n%s' % (size, src))
+            if path is not None or self.failed.get(src):
+                return path
+            try:
+                data = self.fetch(src)
+                paths = dict((name, self.cache.set('%s\n%s' % (name, src), *resize(data, box)))
+                             for name, box in self.sizes.items())
+            except FetchError as e:
+                self.logger.warning('Image proxy: %s', e)
+                self.failed.set(src, True, 1)
+                return None
+        return paths[size]
@@ -0,0 +1,320 @@
+import csv
+import io
+import json
+import os
+import re
+from itertools import islice
+
+from datetime import timedelta
+
+from sqlalchemy import exc, select
+from wtforms.validators import URL, ValidationError
+
+from forms import ArtistForm, VenueForm
+from geo import NOWHERE
+from times import parse_time
+
+#----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows from CSV or JSONL files.
+#
+# Rows are checked with the same rules as the create forms, then written in
+# batches, one transaction per batch, with a multi-row INSERT or, on
+# Postgres, COPY. Rows that fail a check, or that make their batch fail in the
+# database, are written to a rejects file with the reason instead of
+# aborting the import.
+#----------------------------------------------------------------------------#
+
+
+def _choices(field):
+    return set(value for value, label in field.kwargs['choices'])
+
+
+STATES = _choices(VenueForm.state)
+GENRES = _choices(VenueForm.genres)
+URL_REGEX = URL().regex
+TRUE = ('1', 'true', 't', 'yes', 'y')
+FALSE = ('', '0', 'false', 'f', 'no', 'n')
+REQUIRED = {'name', 'city', 'state', 'address'}
+OPTIONAL = {'phone', 'website', 'image_link', 'facebook_link', 'seeking_description'}
+URL_FIELDS = ('website', 'image_link', 'facebook_link')
+FIELDS = {
+    'venue': REQUIRED | OPTIONAL | {'genres', 'seeking_talent'},
+    'artist': (REQUIRED - {'address'}) | OPTIONAL | {'genres', 'seeking_venue'},
+}
+
+
+def read_records(path):
+    """Yield (line number, dict) for each record of a .csv or .jsonl file.
+
+    A JSONL line that does not parse is yielded as its text, which
+    BulkImporter rejects.
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            for number, record in enumerate(csv.DictReader(f), start=2):
+                yield number, record
+    else:
+        with open(path) as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError:
+                        yield number, line.strip()
+
+
+def _text(record, name):
+    value = record.get(name)
+    return value.strip() if isinstance(value, str) else value
+
+
+def _boolean(value, errors, name):
+    if isinstance(value, bool):
+        return value
+    value = (value or '').strip().lower() if isinstance(value, str) else str(value or '').lower()
+    if value in TRUE:
+        return True
+    if value not in FALSE:
+        errors.append('%s must be true or false' % name)
+    return False
+
+
+def _genres(value, errors):
+    # A JSON list, or a ';' separated string in CSV files.
+    if isinstance(value, str):
+        value = [genre.strip() for genre in value.split(';')]
+    elif value is not None and not isinstance(value, list):
+        errors.append('genres must be a list')
+        return []
+    if any(not isinstance(genre, str) for genre in value or []):
+        errors.append('genres must be strings')
+        return []
+    genres = [genre for genre in (value or []) if genre]
+    if not genres:
+        errors.append('genres is required')
+    unknown = [genre for genre in genres if genre not in GENRES]
+    if unknown:
+        errors.append('unknown genres: ' + ', '.join(map(str, unknown)))
+    return genres
+
+
+class RowChecker(object):
+    """Checks one kind of record and turns it into column values.
+
+    ``check_phone`` returns the E.164 form of a phone number, or raises
+    wtforms.ValidationError, like phones.normalize_phone. ``locate``, like
+    geo.Geocoder.locate, gives the position columns of a venue's city.
+    """
+
+    def __init__(self, check_phone, show_duration=timedelta(hours=2), locate=None):
+        self.check_phone = check_phone
+        # end_time of shows that only give a start_time
+        self.show_duration = show_duration
+        self.locate = locate
+
+    def required(self, record, names, errors):
+        values = {}
+        for name in names:
+            values[name] = _text(record, name)
+            if not values[name]:
+                errors.append('%s is required' % name)
+        return values
+
+    def optional(self, record, names):
+        return dict((name, _text(record, name) or None) for name in names)
+
+    def check_values(self, values, errors):
+        # JSON records may hold numbers, lists or objects where text belongs.
+        for name in sorted(values):
+            if values[name] is not None and not isinstance(values[name], str):
+                errors.append('%s must be a string' % name)
+                values[name] = None
+        if values.get('state') and values['state'] not in STATES:
+            errors.append('unknown state %s' % values['state'])
+        if 'phone' in values:
+            try:
+                values['phone_e164'] = self.check_phone(values['phone'] or '')
+            except ValidationError as e:
+                errors.append(str(e))
+        for name in URL_FIELDS:
+            if values.get(name) and not URL_REGEX.match(values[name]):
+                errors.append('%s is not a valid URL' % name)
+
+    def common(self, record, errors, required=()):
+        # Every text field is gathered before check_values() looks at them.
+        values = self.required(record, ['name', 'city', 'state'] + list(required), errors)
+        values.update(self.optional(record, sorted(OPTIONAL)))
+        self.check_values(values, errors)
+        values['genres'] = _genres(record.get('genres'), errors)
+        return values
+
+    def venue(self, record, errors):
+        values = self.common(record, errors, ['address'])
+        values['seeking_talent'] = _boolean(record.get('seeking_talent'), errors, 'seeking_talent')
+        if self.locate is not None:
+            values.update(self.locate(values['city'], values['state']))
+        return values
+
+    def artist(self, record, errors):
+        values = self.common(record, errors)
+        values['seeking_venue'] = _boolean(record.get('seeking_venue'), errors, 'seeking_venue')
+        return values
+
+    def changes(self, kind, record, errors):
+        """Check a partial update of a 'venue' or 'artist': only the fields
+        present in ``record`` are checked and returned."""
+        unknown = sorted(set(record) - FIELDS[kind])
+        if unknown:
+            errors.append('unknown fields: ' + ', '.join(unknown))
+        values = self.required(record, sorted(REQUIRED & FIELDS[kind] & set(record)), errors)
+        values.update(self.optional(record, sorted(OPTIONAL & set(record))))
+        self.check_values(values, errors)
+        if 'genres' in record:
+            values['genres'] = _genres(record['genres'], errors)
+        for name in ('seeking_talent', 'seeking_venue'):
+            if name in record and name in FIELDS[kind]:
+                values[name] = _boolean(record[name], errors, name)
+        if kind == 'venue' and self.locate is not None and ('city' in values or 'state' in values):
+            # A new city alone or state alone applies to rows in different
+            # places; those lose their position until `flask geocode-venues`.
+            if 'city' in values and 'state' in values:
+                values.update(self.locate(values['city'], values['state']))
+            else:
+                values.update(NOWHERE)
+        if not values and not errors:
+            errors.append('no changes given')
+        return values
+
+    def show(self, record, errors):
+        values = {}
+        for name in ('artist_id', 'venue_id'):
+            try:
+                values[name] = int(record.get(name))
+            except (TypeError, ValueError):
+                errors.append('%s must be an integer' % name)
+        for name in ('start_time', 'end_time'):
+            if name == 'end_time' and not record.get(name):
+                if 'start_time' in values:
+                    values['end_time'] = values['start_time'] + self.show_duration
+                continue
+            try:
+                values[name] = parse_time(str(record.get(name) or ''))
+            except (ValueError, OverflowError):
+                errors.append('%s is not a valid date and time' % name)
+        if 'start_time' in values and 'end_time' in values \
+                and values['end_time'] <= values['start_time']:
+            errors.append('end_time must be after start_time')
+        return values
+
+
+class BulkImporter(object):
+
+    def __init__(self, db, table, check, batch_size=1000, use_copy=False,
+                 rejects=None, foreign_keys=None):
+        # foreign_keys maps a column to the table its values must exist in;
+        # they are checked with one query per batch.
+        self.db = db
+        self.table = table
+        self.check = check
+        self.batch_size = batch_size
+        self.use_copy = use_copy and db.engine.dialect.name == 'postgresql'
+        self.rejects = rejects
+        self.foreign_keys = foreign_keys or {}
+        self.imported = 0
+        self.rejected = 0
+
+    def reject(self, number, record, errors):
+        self.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({'line': number, 'record': record, 'errors': errors},
+                                          default=str) + '\n')
+
+    def run(self, records):
+        records = iter(records)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            self.load(batch)
+        return self.imported, self.rejected
+
+    def load(self, batch):
+        rows = []
+        for number, record in batch:
+            errors = []
+            if isinstance(record, dict):
+                values = self.check(record, errors)
+            else:
+                errors.append('not a JSON object')
+            if errors:
+                self.reject(number, record, errors)
+            else:
+                rows.append((number, record, values))
+        rows = self.check_foreign_keys(rows)
+        if not rows:
+            return
+        try:
+            self.write([values for number, record, values in rows])
+            self.db.session.commit()
+            self.imported += len(rows)
+        except exc.DBAPIError:
+            self.db.session.rollback()
+            # Isolate the offending rows; the rest of the batch still loads.
+            for number, record, values in rows:
+                try:
+                    self.db.session.execute(self.table.insert(), [values])
+                    self.db.session.commit()
+                    self.imported += 1
+                except exc.DBAPIError as e:
+                    self.db.session.rollback()
+                    self.reject(number, record, [str(e.orig).strip()])
+
+    def check_foreign_keys(self, rows):
+        for column, target in self.foreign_keys.items():
+            wanted = set(values[column] for number, record, values in rows)
+            if not wanted:
+                continue
+            found = set(id for id, in self.db.session.execute(
+                select([target.c.id]).where(target.c.id.in_(wanted))))
+            kept = []
+            for number, record, values in rows:
+                if values[column] in found:
+                    kept.append((number, record, values))
+                else:
+                    self.reject(number, record, ['%s %s does not exist' % (column, values[column])])
+            rows = kept
+        return rows
+
+    def write(self, rows):
+        if self.use_copy:
+            self.copy(rows)
+        else:
+            # One multi-row INSERT ... VALUES statement per batch.
+            self.db.session.execute(self.table.insert().values(rows))
+
+    def copy(self, rows):
+        columns = sorted(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in rows:
+            writer.writerow([_copy_value(values[column]) for column in columns])
+        buffer.seek(0)
+        cursor = self.db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT csv)'
+                           % (self.table.name, ', '.join(columns)), buffer)
+
+
+def _copy_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        # Postgres array literal.
+        return '{' + ','.join('"%s"' % re.sub(r'(["\\])', r'\\\1', item) for item in value) + '}'
+    return value
+
+
+def rejects_path(path):
+    root, ext = os.path.splitext(path)
+    return root + '.rejects.jsonl'
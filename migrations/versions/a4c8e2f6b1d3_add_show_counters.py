@@ -0,0 +1,46 @@
+"""Add upcoming/past show counters
+
+Revision ID: a4c8e2f6b1d3
+Revises: f1b7c3d9a2e4
+Create Date: 2026-10-18 14:22:17.663950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2f6b1d3'
+down_revision = 'f1b7c3d9a2e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_table('show_rollover',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('counted_until', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Show start times are naive local times, hence localtimestamp.
+    op.execute("INSERT INTO show_rollover (id, counted_until) VALUES (1, localtimestamp)")
+    for table, column in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute("""
+            UPDATE {table} SET
+              upcoming_shows_count = (SELECT count(*) FROM show
+                WHERE show.{column} = {table}.id AND show.start_time >= r.counted_until),
+              past_shows_count = (SELECT count(*) FROM show
+                WHERE show.{column} = {table}.id AND show.start_time < r.counted_until)
+            FROM show_rollover r
+        """.format(table=table, column=column))
+
+
+def downgrade():
+    op.drop_table('show_rollover')
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,46 @@
+"""Shard collection versions and drop unused show versions
+
+Revision ID: a7c2e9d4b6f1
+Revises: f8b3d6e2a1c9
+Create Date: 2026-10-18 21:12:09.604319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e9d4b6f1'
+down_revision = 'f8b3d6e2a1c9'
+branch_labels = None
+depends_on = None
+
+# DataVersion.SHARDS
+SHARDS = 16
+
+
+def upgrade():
+    op.add_column('data_version', sa.Column('shard', sa.Integer(), nullable=False, server_default='0'))
+    op.drop_constraint('data_version_pkey', 'data_version', type_='primary')
+    op.create_primary_key('data_version_pkey', 'data_version', ['name', 'shard'])
+    # The new rows start at 0 so every collection keeps its version.
+    op.execute('INSERT INTO data_version (name, shard, version, updated_at) '
+               'SELECT name, shard, 0, updated_at FROM data_version, '
+               'generate_series(1, %d) AS shard' % (SHARDS - 1))
+    # Nothing reads or bumps them; show pages are versioned through their
+    # venue and artist.
+    op.drop_column('show', 'version')
+    op.drop_column('show', 'updated_at')
+
+
+def downgrade():
+    op.add_column('show', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                    server_default=sa.text("timezone('utc', now())")))
+    op.add_column('show', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.execute('UPDATE data_version d SET version = s.version FROM '
+               '(SELECT name, sum(version) AS version FROM data_version GROUP BY name) s '
+               'WHERE d.name = s.name AND d.shard = 0')
+    op.execute('DELETE FROM data_version WHERE shard <> 0')
+    op.drop_constraint('data_version_pkey', 'data_version', type_='primary')
+    op.create_primary_key('data_version_pkey', 'data_version', ['name'])
+    op.drop_column('data_version', 'shard')
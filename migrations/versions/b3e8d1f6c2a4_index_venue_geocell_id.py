@@ -0,0 +1,28 @@
+"""Index venues by geocell and id
+
+Revision ID: b3e8d1f6c2a4
+Revises: a7c2e9d4b6f1
+Create Date: 2026-10-18 22:04:51.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d1f6c2a4'
+down_revision = 'a7c2e9d4b6f1'
+branch_labels = None
+depends_on = None
+
+# A near search reads the venues of one position lowest id first.
+
+
+def upgrade():
+    op.create_index('ix_venue_geocell_id', 'venue', ['geocell', 'id'], unique=False)
+    op.drop_index('ix_venue_geocell', table_name='venue')
+
+
+def downgrade():
+    op.create_index('ix_venue_geocell', 'venue', ['geocell'], unique=False)
+    op.drop_index('ix_venue_geocell_id', table_name='venue')
@@ -0,0 +1,41 @@
+"""Add indexes for the listing, detail and validator queries
+
+Revision ID: b7d2f5a9c4e1
+Revises: a4c8e2f6b1d3
+Create Date: 2026-10-18 15:10:52.208733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f5a9c4e1'
+down_revision = 'a4c8e2f6b1d3'
+branch_labels = None
+depends_on = None
+
+# The trailing id columns match the keyset pagination order of /venues and
+# /shows, so those pages are read straight off the index.
+INDEXES = [
+    ('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time']),
+    ('ix_show_start_time', 'show', ['start_time', 'id']),
+    ('ix_venue_city_state', 'venue', ['city', 'state', 'id']),
+    ('ix_venue_name_lower', 'venue', [sa.text('lower(name)')]),
+    ('ix_artist_name_lower', 'artist', [sa.text('lower(name)')]),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while the indexes build; it
+    # cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
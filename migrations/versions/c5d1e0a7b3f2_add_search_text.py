@@ -0,0 +1,50 @@
+"""Add trigram-indexed search text
+
+Revision ID: c5d1e0a7b3f2
+Revises: 2b4fbf836697
+Create Date: 2026-10-18 09:12:44.310527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d1e0a7b3f2'
+down_revision = '2b4fbf836697'
+branch_labels = None
+depends_on = None
+
+DOCUMENT = "lower(concat_ws(' ', {0}name, {0}city, {0}state, array_to_string({0}genres, ' ')))"
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION search_text_document() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_text := {};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(DOCUMENT.format('NEW.')))
+
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('search_text', sa.Text(), nullable=True))
+        op.execute('UPDATE {} SET search_text = {}'.format(table, DOCUMENT.format('')))
+        op.execute("""
+            CREATE TRIGGER {0}_search_text
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {0}
+            FOR EACH ROW EXECUTE PROCEDURE search_text_document()
+        """.format(table))
+        op.create_index('ix_{}_search_text_trgm'.format(table), table, ['search_text'],
+                        postgresql_using='gin',
+                        postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_{}_search_text_trgm'.format(table), table_name=table)
+        op.execute('DROP TRIGGER {0}_search_text ON {0}'.format(table))
+        op.drop_column(table, 'search_text')
+    op.execute('DROP FUNCTION search_text_document()')
@@ -0,0 +1,52 @@
+"""Add normalized E.164 phone columns
+
+Revision ID: c9e4a1b6d8f2
+Revises: b7d2f5a9c4e1
+Create Date: 2026-10-18 16:48:09.551302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import phonenumbers
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e4a1b6d8f2'
+down_revision = 'b7d2f5a9c4e1'
+branch_labels = None
+depends_on = None
+
+# Same rules as phones.normalize_phone at the time of writing; numbers it
+# would reject are left NULL.
+REGION = 'US'
+BATCH_SIZE = 1000
+
+
+def e164(number):
+    try:
+        parsed = phonenumbers.parse(number.strip(), REGION)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(parsed):
+        return None
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
+def upgrade():
+    connection = op.get_bind()
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('phone_e164', sa.String(length=16), nullable=True))
+        rows = connection.execute(sa.text(
+            "SELECT id, phone FROM %s WHERE phone IS NOT NULL AND phone <> ''" % table)).fetchall()
+        update = sa.text("UPDATE %s SET phone_e164 = :phone_e164 WHERE id = :id" % table)
+        values = [{'id': id, 'phone_e164': e164(phone)} for id, phone in rows]
+        values = [row for row in values if row['phone_e164']]
+        for start in range(0, len(values), BATCH_SIZE):
+            connection.execute(update, values[start:start + BATCH_SIZE])
+        op.create_index(op.f('ix_%s_phone_e164' % table), table, ['phone_e164'], unique=False)
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index(op.f('ix_%s_phone_e164' % table), table_name=table)
+        op.drop_column(table, 'phone_e164')
@@ -0,0 +1,62 @@
+"""Add show end times and reject double bookings
+
+Revision ID: d2f6b8a3e5c7
+Revises: c9e4a1b6d8f2
+Create Date: 2026-10-18 17:32:41.870215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f6b8a3e5c7'
+down_revision = 'c9e4a1b6d8f2'
+branch_labels = None
+depends_on = None
+
+# Existing shows get the default length of SHOW_DURATION_MINUTES, cut short
+# where the venue or the artist has a later show starting sooner.
+DURATION_MINUTES = 120
+BACKFILL = """
+    UPDATE show SET end_time = least(
+        start_time + interval '%d minutes',
+        (SELECT min(n.start_time) FROM show n
+         WHERE n.venue_id = show.venue_id AND n.start_time > show.start_time),
+        (SELECT min(n.start_time) FROM show n
+         WHERE n.artist_id = show.artist_id AND n.start_time > show.start_time))
+""" % DURATION_MINUTES
+# The GiST index behind each constraint answers both the overlap check on
+# insert and booking_conflict()'s lookup of the show that is in the way.
+CONSTRAINTS = [
+    ('show_venue_no_overlap', 'venue_id'),
+    ('show_artist_no_overlap', 'artist_id'),
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    # Lets a GiST index hold the plain integer id next to the time range.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute(BACKFILL)
+    op.alter_column('show', 'end_time', nullable=False)
+    op.create_check_constraint('show_end_after_start', 'show', 'end_time > start_time')
+    # Only shows starting at the same time still overlap.
+    for name, column in CONSTRAINTS:
+        clash = connection.execute(sa.text(
+            'SELECT a.id, b.id FROM show a JOIN show b ON a.{0} = b.{0} AND a.id < b.id '
+            'AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time) '
+            'LIMIT 1'.format(column))).first()
+        if clash is not None:
+            raise RuntimeError('Shows %d and %d overlap on the same %s; reschedule or delete '
+                               'one of them before upgrading.' % (clash[0], clash[1], column[:-3]))
+        op.execute('ALTER TABLE show ADD CONSTRAINT %s EXCLUDE USING gist '
+                   '(%s WITH =, tsrange(start_time, end_time) WITH &&)' % (name, column))
+
+
+def downgrade():
+    for name, column in reversed(CONSTRAINTS):
+        op.drop_constraint(name, 'show')
+    op.drop_constraint('show_end_after_start', 'show', type_='check')
+    op.drop_column('show', 'end_time')
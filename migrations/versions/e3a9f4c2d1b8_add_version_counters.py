@@ -0,0 +1,38 @@
+"""Add version counters
+
+Revision ID: e3a9f4c2d1b8
+Revises: c5d1e0a7b3f2
+Create Date: 2026-10-18 11:40:03.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a9f4c2d1b8'
+down_revision = 'c5d1e0a7b3f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    data_version = op.create_table('data_version',
+    sa.Column('name', sa.String(length=40), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(data_version, [
+        {'name': 'venues', 'version': 1},
+        {'name': 'artists', 'version': 1},
+        {'name': 'shows', 'version': 1},
+    ])
+
+
+def downgrade():
+    op.drop_table('data_version')
+    for table in ('show', 'artist', 'venue'):
+        op.drop_column(table, 'version')
@@ -0,0 +1,33 @@
+"""Add venue positions and a geocell index
+
+Revision ID: e5a7c1d4f9b2
+Revises: d2f6b8a3e5c7
+Create Date: 2026-10-18 18:21:07.334519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c1d4f9b2'
+down_revision = 'd2f6b8a3e5c7'
+branch_labels = None
+depends_on = None
+
+# Existing venues are placed afterwards with `flask geocode-venues`, which
+# reads the geocoding table of the running app.
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venue', sa.Column('geocell', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_venue_geocell'), 'venue', ['geocell'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_venue_geocell'), table_name='venue')
+    op.drop_column('venue', 'geocell')
+    op.drop_column('venue', 'longitude')
+    op.drop_column('venue', 'latitude')
@@ -0,0 +1,29 @@
+"""Add updated_at timestamps
+
+Revision ID: f1b7c3d9a2e4
+Revises: e3a9f4c2d1b8
+Create Date: 2026-10-18 13:05:41.402187
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7c3d9a2e4'
+down_revision = 'e3a9f4c2d1b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows count as modified now; the application sets the column
+    # on every later write (see bump_versions in app.py).
+    for table in ('venue', 'artist', 'show', 'data_version'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+
+
+def downgrade():
+    for table in ('data_version', 'show', 'artist', 'venue'):
+        op.drop_column(table, 'updated_at')
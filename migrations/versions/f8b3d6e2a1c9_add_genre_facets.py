@@ -0,0 +1,109 @@
+"""Add genre indexes and trigger-maintained genre counts
+
+Revision ID: f8b3d6e2a1c9
+Revises: e5a7c1d4f9b2
+Create Date: 2026-10-18 19:04:36.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8b3d6e2a1c9'
+down_revision = 'e5a7c1d4f9b2'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist')
+
+# (id, genre, city, state, change) for every genre of the given rows; a
+# genre listed twice in one row counts once.
+ROWS = """
+    SELECT DISTINCT r.id, genre, r.city, r.state, {sign} AS change
+    FROM {rows} r {join}, unnest(r.genres) AS genre {where}"""
+MOVED = """JOIN {other} o ON o.id = r.id"""
+DIFFERENT = """WHERE (r.city, r.state, r.genres) IS DISTINCT FROM (o.city, o.state, o.genres)"""
+
+# Adds the changes per city and, with city and state '', in total. Rows are
+# locked in key order so concurrent writers cannot deadlock.
+COUNT = """
+    INSERT INTO genre_count (kind, state, city, genre, count)
+    SELECT {kind}, coalesce(state, ''), coalesce(city, ''), genre, sum(change)
+    FROM ({changes}) AS changes
+    GROUP BY GROUPING SETS ((genre, city, state), (genre))
+    HAVING sum(change) <> 0
+    ORDER BY 2, 3, 4
+    ON CONFLICT (kind, state, city, genre) DO UPDATE SET count = genre_count.count + excluded.count"""
+
+
+def rows(rows, sign, other=None):
+    if other is None:
+        return ROWS.format(rows=rows, sign=sign, join='', where='')
+    return ROWS.format(rows=rows, sign=sign, join=MOVED.format(other=other), where=DIFFERENT)
+
+
+# Statement-level triggers see all rows a statement changed at once, so a
+# bulk import or update costs one upsert per (genre, city) it touches.
+# Updates that leave city, state and genres alone write nothing.
+FUNCTION = """
+    CREATE OR REPLACE FUNCTION count_genres() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {insert};
+        ELSIF TG_OP = 'DELETE' THEN
+            {delete};
+        ELSE
+            {update};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+""".format(
+    insert=COUNT.format(kind='TG_ARGV[0]', changes=rows('new_rows', 1)),
+    delete=COUNT.format(kind='TG_ARGV[0]', changes=rows('old_rows', -1)),
+    update=COUNT.format(kind='TG_ARGV[0]', changes=rows('new_rows', 1, 'old_rows')
+                        + '\n    UNION ALL' + rows('old_rows', -1, 'new_rows')))
+
+TRIGGERS = [
+    ('insert', 'INSERT', 'NEW TABLE AS new_rows'),
+    ('update', 'UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ('delete', 'DELETE', 'OLD TABLE AS old_rows'),
+]
+
+
+def upgrade():
+    op.create_table('genre_count',
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('genre', sa.String(length=120), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'state', 'city', 'genre')
+    )
+    op.execute(FUNCTION)
+    # Creating the triggers locks out writers until this migration commits,
+    # so the counts below start out exact.
+    for table in TABLES:
+        for name, event, referencing in TRIGGERS:
+            op.execute('CREATE TRIGGER {0}_genre_count_{1} AFTER {2} ON {0} '
+                       'REFERENCING {3} FOR EACH STATEMENT EXECUTE PROCEDURE count_genres({4})'
+                       .format(table, name, event, referencing, "'%s'" % table))
+        op.execute(COUNT.format(kind="'%s'" % table, changes=rows(table, 1)))
+    # GIN indexes answer genres @> ARRAY[...]. A plain CREATE INDEX keeps
+    # the tables writable only if it runs outside the transaction.
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index('ix_%s_genres' % table, table, ['genres'],
+                            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in reversed(TABLES):
+            op.drop_index('ix_%s_genres' % table, table_name=table, postgresql_concurrently=True)
+    for table in reversed(TABLES):
+        for name, event, referencing in reversed(TRIGGERS):
+            op.execute('DROP TRIGGER {0}_genre_count_{1} ON {0}'.format(table, name))
+    op.execute('DROP FUNCTION count_genres()')
+    op.drop_table('genre_count')
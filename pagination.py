@@ -0,0 +1,289 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import and_, or_, select, tuple_, union_all
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+#----------------------------------------------------------------------------#
+# Keyset (seek) pagination.
+#
+# Pages are addressed by the ordering key of the row they start after (or end
+# before), never by an OFFSET, so fetching page N costs the same index range
+# scan as fetching page 1. Cursors travel in the query string as opaque
+# url-safe tokens.
+#----------------------------------------------------------------------------#
+
+NEXT = 'n'
+PREV = 'p'
+
+
+class Page(object):
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def next_url(self):
+        return page_url(self.next_cursor) if self.has_next else None
+
+    @property
+    def prev_url(self):
+        return page_url(self.prev_cursor) if self.has_prev else None
+
+
+def page_url(cursor):
+    # Same endpoint and query string as the current request, new cursor.
+    # Search forms POST their terms, which the links carry on as GET
+    # parameters; request.values holds both.
+    args = dict(request.view_args or {})
+    args.update(request.values.to_dict())
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **args)
+
+
+def page_size(per_page=None):
+    if per_page is None:
+        per_page = request.args.get('per_page', type=int)
+    if per_page is None:
+        per_page = current_app.config.get('PAGE_SIZE', 20)
+    return max(1, min(per_page, current_app.config.get('MAX_PAGE_SIZE', 100)))
+
+#----------------------------------------------------------------------------#
+# Cursor tokens.
+#----------------------------------------------------------------------------#
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError('unknown cursor value')
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_dump_value(v) for v in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = [_load_value(v) for v in values]
+    except (binascii.Error, ValueError, TypeError, UnicodeError):
+        abort(400)
+    if direction not in (NEXT, PREV) or len(values) != size:
+        abort(400)
+    return direction, values
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def _split_key(key):
+    # Keys are columns or labels, optionally wrapped in .desc().
+    if isinstance(key, UnaryExpression) and key.modifier is operators.desc_op:
+        return key.element, True
+    if isinstance(key, UnaryExpression) and key.modifier is operators.asc_op:
+        return key.element, False
+    return key, False
+
+
+def _key_name(column):
+    name = getattr(column, 'key', None) or getattr(column, 'name', None)
+    if name is None:
+        raise ValueError('pagination keys must be named columns or labels')
+    return name
+
+
+def _seek(columns, descending, values, forward):
+    # Rows strictly after the cursor in the (possibly reversed) ordering.
+    def beyond(column, desc, value):
+        return column < value if desc == forward else column > value
+
+    if len(set(descending)) == 1:
+        # A row-value comparison lets Postgres seek a composite index directly.
+        return beyond(tuple_(*columns), descending[0], tuple_(*values))
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*(equal + [beyond(column, descending[i], values[i])])))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, keys, cursor=None, per_page=None):
+    """Return one Page of ``query`` ordered by ``keys``.
+
+    ``keys`` must form a unique ordering (end with the primary key) and each
+    key must be readable as an attribute of the rows the query returns.
+    ``cursor`` and ``per_page`` default to the request's query string.
+    """
+    if cursor is None:
+        cursor = request.args.get('cursor') or None
+    per_page = page_size(per_page)
+    columns, descending = zip(*[_split_key(key) for key in keys])
+    names = [_key_name(column) for column in columns]
+
+    direction, values = NEXT, None
+    if cursor is not None:
+        direction, values = decode_cursor(cursor, len(columns))
+    forward = direction == NEXT
+
+    ordering = [column.desc() if desc == forward else column.asc()
+                for column, desc in zip(columns, descending)]
+    query = query.order_by(None).order_by(*ordering)
+    if values is not None:
+        query = query.filter(_seek(columns, descending, values, forward))
+    rows = query.limit(per_page + 1).all()
+    return _page(rows, per_page, names, forward, values)
+
+
+def keyset_paginate_parts(parts, keys, cursor=None, per_page=None):
+    """Like keyset_paginate(), over queries that follow each other.
+
+    ``parts`` is a list of (prefix, query) in page order. Every row of a part
+    has the leading keys ``prefix`` and sorts before the rows of the next
+    part, so each query is only ordered and sought on the remaining keys
+    and cut to a page. The parts are sent as one UNION ALL statement, whose
+    rows are then put in order: one round trip, however many parts are
+    empty, and no sort of a large part.
+    """
+    if cursor is None:
+        cursor = request.args.get('cursor') or None
+    per_page = page_size(per_page)
+    columns, descending = zip(*[_split_key(key) for key in keys])
+    names = [_key_name(column) for column in columns]
+
+    direction, values = NEXT, None
+    if cursor is not None:
+        direction, values = decode_cursor(cursor, len(columns))
+    forward = direction == NEXT
+
+    session, selects = None, []
+    for prefix, query in parts:
+        size = len(prefix)
+        position = 1 if forward else -1
+        if values is not None:
+            position = _compare(tuple(prefix), tuple(values[:size]), descending[:size])
+            if position == (-1 if forward else 1):
+                continue
+        ordering = [column.desc() if desc == forward else column.asc()
+                    for column, desc in zip(columns[size:], descending[size:])]
+        query = query.order_by(None).order_by(*ordering)
+        if position == 0:
+            query = query.filter(_seek(columns[size:], descending[size:], values[size:], forward))
+        session = query.session
+        selects.append(query.limit(per_page + 1).subquery().select())
+    if not selects:
+        return Page([])
+    rows = union_all(*selects).alias()
+    ordering = [rows.c[name].desc() if desc == forward else rows.c[name].asc()
+                for name, desc in zip(names, descending)]
+    rows = session.execute(select([rows]).order_by(*ordering).limit(per_page + 1)).fetchall()
+    return _page(rows, per_page, names, forward, values)
+
+
+def _page(rows, per_page, names, forward, values):
+    # Up to per_page + 1 rows read in the direction of the cursor, if any.
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if not forward:
+        items.reverse()
+    if not items:
+        return Page(items)
+
+    def cursor_for(d, item):
+        return encode_cursor(d, [getattr(item, name) for name in names])
+
+    if forward:
+        next_cursor = cursor_for(NEXT, items[-1]) if more else None
+        prev_cursor = cursor_for(PREV, items[0]) if values is not None else None
+    else:
+        next_cursor = cursor_for(NEXT, items[-1])
+        prev_cursor = cursor_for(PREV, items[0]) if more else None
+    return Page(items, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def _compare(a, b, descending):
+    # -1/0/1 comparison of two key tuples under a mixed-direction ordering.
+    for x, y, desc in zip(a, b, descending):
+        if x != y:
+            return (1 if x > y else -1) * (-1 if desc else 1)
+    return 0
+
+
+def paginate_sequence(items, names, descending=None, cursor=None, per_page=None):
+    """Page through an already sorted in-memory sequence with the same cursor
+    tokens and semantics as keyset_paginate().
+
+    ``names`` are the attributes each item is sorted by; ``descending`` holds
+    one flag per name.
+    """
+    if cursor is None:
+        cursor = request.args.get('cursor') or None
+    per_page = page_size(per_page)
+    descending = tuple(descending or (False,) * len(names))
+
+    def key(item):
+        return tuple(getattr(item, name) for name in names)
+
+    start, stop = 0, len(items)
+    direction, values = NEXT, None
+    if cursor is not None:
+        direction, values = decode_cursor(cursor, len(names))
+        if direction == NEXT:
+            while start < stop and _compare(key(items[start]), values, descending) <= 0:
+                start += 1
+        else:
+            while stop > start and _compare(key(items[stop - 1]), values, descending) >= 0:
+                stop -= 1
+
+    if direction == NEXT:
+        page = list(items[start:start + per_page])
+        more = start + per_page < stop
+    else:
+        page = list(items[max(start, stop - per_page):stop])
+        more = stop - per_page > start
+    if not page:
+        return Page(page)
+
+    def cursor_for(d, item):
+        return encode_cursor(d, list(key(item)))
+
+    if direction == NEXT:
+        next_cursor = cursor_for(NEXT, page[-1]) if more else None
+        prev_cursor = cursor_for(PREV, page[0]) if values is not None else None
+    else:
+        next_cursor = cursor_for(NEXT, page[-1])
+        prev_cursor = cursor_for(PREV, page[0]) if more else None
+    return Page(page, next_cursor=next_cursor, prev_cursor=prev_cursor)
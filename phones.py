@@ -0,0 +1,49 @@
+import phonenumbers
+from wtforms.validators import ValidationError
+
+#----------------------------------------------------------------------------#
+# Phone numbers.
+#
+# Numbers are shown as entered and stored a second time in E.164 form
+# (+14155550123) in the indexed phone_e164 columns, which lookups and
+# duplicate checks use. Numbers without a country code are read as
+# PHONE_REGION numbers.
+#----------------------------------------------------------------------------#
+
+PHONE_REGION = 'US'
+MESSAGE = 'Not a valid phone number. Phone numbers must look like 333-222-1111.'
+
+
+class PhoneNumber(object):
+    """Validates and normalizes phone numbers for one default region.
+
+    An instance is a wtforms field validator; its normalize() returns the
+    E.164 form of a number, or None for a blank one, and raises
+    ValidationError for anything else.
+    """
+
+    def __init__(self, region=PHONE_REGION, message=MESSAGE):
+        self.region = region
+        self.message = message
+        # Loads the region's metadata now rather than on the first request.
+        phonenumbers.example_number(region)
+
+    def normalize(self, number):
+        number = (number or '').strip()
+        if not number:
+            return None
+        try:
+            parsed = phonenumbers.parse(number, self.region)
+        except phonenumbers.NumberParseException:
+            raise ValidationError(self.message)
+        if not phonenumbers.is_possible_number(parsed):
+            raise ValidationError(self.message)
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+    def __call__(self, form, field):
+        self.normalize(field.data)
+
+
+# Shared by the forms, the controllers and the importer.
+phone_number = PhoneNumber()
+normalize_phone = phone_number.normalize
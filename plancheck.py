@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Query plan regression check.
+#
+# Requests a set of pages through the test client, records every SELECT the
+# views send to the database and runs EXPLAIN on each of them. A sequential
+# scan of a table holding at least min_rows rows means a query lost its
+# index; run it against a seeded database, since on small tables Postgres
+# rightly prefers scanning.
+#----------------------------------------------------------------------------#
+
+
+@contextmanager
+def capture_queries():
+    """Collect (statement, parameters) for every SELECT executed, on any
+    engine, inside the block."""
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            queries.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def large_tables(connection, min_rows):
+    # reltuples is the planner's own estimate, fresh after ANALYZE.
+    cursor = connection.cursor()
+    cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %s",
+                   (min_rows,))
+    return set(name for name, in cursor.fetchall())
+
+
+def explain(connection, statement, parameters):
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+    return cursor.fetchone()[0][0]['Plan']
+
+
+def seq_scans(plan, tables):
+    """Yield the names of ``tables`` read by a Seq Scan node in ``plan``."""
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+        yield plan['Relation Name']
+    for child in plan.get('Plans', ()):
+        for name in seq_scans(child, tables):
+            yield name
+
+
+def check_plans(app, engine, urls, min_rows=10000):
+    """Return a list of (url, table, statement) for every sequential scan
+    of a large table made while serving ``urls``."""
+    client = app.test_client()
+    connection = engine.raw_connection()
+    try:
+        tables = large_tables(connection, min_rows)
+        problems = []
+        for url in urls:
+            with capture_queries() as queries:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError('GET %s returned %d' % (url, response.status_code))
+            seen = set()
+            for statement, parameters in queries:
+                for table in seq_scans(explain(connection, statement, parameters), tables):
+                    if (table, statement) not in seen:
+                        seen.add((table, statement))
+                        problems.append((url, table, statement))
+        return problems
+    finally:
+        connection.rollback()
+        connection.close()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool instrumentation and statement timeouts.
+#----------------------------------------------------------------------------#
+
+
+class PoolStats(object):
+    """Checkout wait times and occupancy of one connection pool in this
+    worker. Multiply peak_in_use by the number of workers to see how close a
+    deployment gets to its database's max_connections."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.capacity = 0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_in_use(self, in_use, capacity):
+        with self.lock:
+            self.in_use = in_use
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self.capacity = capacity
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': 1000.0 * self.total_wait / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': 1000.0 * self.max_wait,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'capacity': self.capacity,
+                'saturation': float(self.in_use) / self.capacity if self.capacity else 0.0,
+                'peak_saturation': float(self.peak_in_use) / self.capacity if self.capacity else 0.0,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records in its ``stats`` how long each checkout
+    waited for a connection and how many connections are in use."""
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        # Engine.dispose() replaces the pool; its figures carry on.
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.time()
+        try:
+            connection = super(InstrumentedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.time() - start, timed_out=True)
+            raise
+        self.stats.record_wait(time.time() - start)
+        self._record_in_use()
+        return connection
+
+    def _do_return_conn(self, conn):
+        super(InstrumentedQueuePool, self)._do_return_conn(conn)
+        self._record_in_use()
+
+    def _record_in_use(self):
+        # A negative max_overflow means the pool may grow without bound.
+        overflow = self._max_overflow if self._max_overflow >= 0 else 0
+        self.stats.record_in_use(self.checkedout(), self.size() + overflow)
+
+
+def pool_stats(app, db):
+    """Snapshots of the instrumented pools of the primary ('primary') and
+    of every bind, by bind key."""
+    stats = {}
+    for key in [None] + sorted(app.config.get('SQLALCHEMY_BINDS') or {}):
+        pool = db.get_engine(app, bind=key).pool
+        if isinstance(pool, InstrumentedQueuePool):
+            stats[key or 'primary'] = pool.stats.snapshot()
+    return stats
+
+
+def statement_timeout(app, endpoint):
+    timeouts = app.config.get('STATEMENT_TIMEOUTS') or {}
+    return timeouts.get(endpoint, app.config.get('STATEMENT_TIMEOUT'))
+
+
+def init_statement_timeouts(app, db):
+    """Apply STATEMENT_TIMEOUT (milliseconds), or the STATEMENT_TIMEOUTS
+    entry for the current endpoint, to every transaction a request begins.
+
+    SET LOCAL only lasts until the transaction ends, so the setting never
+    leaks to the next user of a pooled connection.
+    """
+
+    @event.listens_for(db.session, 'after_begin')
+    def set_statement_timeout(session, transaction, connection):
+        if not has_request_context() or connection.dialect.name != 'postgresql':
+            return
+        timeout = statement_timeout(current_app, request.endpoint)
+        if timeout:
+            connection.execute('SET LOCAL statement_timeout = %d' % int(timeout))
@@ -0,0 +1,160 @@
+import re
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request instrumentation.
+#
+# With PROFILE_REQUESTS set, every request records its query count and SQL
+# time (from engine events, so replica binds are included), template
+# rendering time (from Flask's template signals) and time spent in the
+# datetime filters. The totals are sent as a Server-Timing header, which
+# browser dev tools show next to the request, and HTML pages get a small
+# panel at the bottom. A statement shape that runs more than
+# PROFILE_REPEAT_THRESHOLD times in one request is logged as a likely N+1.
+#----------------------------------------------------------------------------#
+
+# Expanded IN lists differ in length from one call to the next.
+PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%\(\w+\)s|\?)(?:\s*,\s*(?:%\(\w+\)s|\?))*\s*\)')
+
+
+def statement_shape(statement):
+    return PLACEHOLDER_LIST.sub('(...)', ' '.join(statement.split()))
+
+
+class RequestProfile(object):
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.filter_time = 0.0
+        self.filter_depth = 0
+        self.template_start = None
+        self.shapes = Counter()
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+    def timings(self):
+        """(name, milliseconds, description) in Server-Timing order."""
+        total = time.perf_counter() - self.start
+        other = max(total - self.sql_time - self.template_time - self.filter_time, 0.0)
+        return [
+            ('sql', 1000.0 * self.sql_time, '%d queries' % self.queries),
+            ('tpl', 1000.0 * self.template_time, 'templates'),
+            ('filter', 1000.0 * self.filter_time, 'datetime filters'),
+            ('app', 1000.0 * other, 'views and ORM loading'),
+            ('total', 1000.0 * total, 'total'),
+        ]
+
+
+def current_profile():
+    return g.get('profile') if has_request_context() else None
+
+
+def timed_filter(fn):
+    """Count the time spent in ``fn`` as filter time of the current request."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = current_profile()
+        if profile is None:
+            return fn(*args, **kwargs)
+        # Filters calling filters are only counted once.
+        profile.filter_depth += 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.filter_depth -= 1
+            if not profile.filter_depth:
+                profile.filter_time += time.perf_counter() - start
+    return wrapper
+
+
+def server_timing(profile):
+    return ', '.join('%s;dur=%.2f;desc="%s"' % timing for timing in profile.timings())
+
+
+def render_panel(profile, repeated):
+    rows = ''.join('<tr><th>%s</th><td>%.2f ms</td><td>%s</td></tr>' % (name, ms, escape(desc))
+                   for name, ms, desc in profile.timings())
+    warnings = ''.join('<li>%d &times; <code>%s</code></li>' % (count, escape(shape))
+                       for shape, count in repeated)
+    if warnings:
+        warnings = '<p><strong>Repeated statements</strong></p><ul>%s</ul>' % warnings
+    return ('<div id="profile-panel" class="container" style="font-size:12px;opacity:.8">'
+            '<table class="table table-condensed">%s</table>%s</div>' % (rows, warnings))
+
+
+class Profiler(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PROFILE_REQUESTS', False)
+        self.threshold = app.config.get('PROFILE_REPEAT_THRESHOLD', 5)
+        self.panel = app.config.get('PROFILE_PANEL', True)
+        app.extensions['profiler'] = self
+        if not self.enabled:
+            return
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        before_render_template.connect(self.template_started, app)
+        template_rendered.connect(self.template_finished, app)
+        event.listen(Engine, 'before_cursor_execute', self.query_started)
+        event.listen(Engine, 'after_cursor_execute', self.query_finished)
+
+    def start(self):
+        g.profile = RequestProfile()
+
+    def query_started(self, conn, cursor, statement, parameters, context, executemany):
+        if current_profile() is not None:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    def query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile()
+        if profile is None or not conn.info.get('profile_query_start'):
+            return
+        profile.sql_time += time.perf_counter() - conn.info['profile_query_start'].pop()
+        profile.queries += 1
+        profile.shapes[statement_shape(statement)] += 1
+
+    def template_started(self, sender, template, context, **extra):
+        profile = current_profile()
+        if profile is not None:
+            profile.template_start = (time.perf_counter(), profile.filter_time)
+
+    def template_finished(self, sender, template, context, **extra):
+        profile = current_profile()
+        if profile is not None and profile.template_start is not None:
+            # Filters applied by the template are counted as filter time.
+            start, filter_time = profile.template_start
+            profile.template_time += (time.perf_counter() - start) - (profile.filter_time - filter_time)
+            profile.template_start = None
+
+    def finish(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        repeated = profile.repeated(self.threshold)
+        for shape, count in repeated:
+            self.app.logger.warning('%s %s ran the same statement %d times: %s',
+                                    request.method, request.full_path.rstrip('?'), count, shape)
+        response.headers['Server-Timing'] = server_timing(profile)
+        if self.panel and response.mimetype == 'text/html' and not response.direct_passthrough \
+                and not response.is_streamed:
+            body = response.get_data(as_text=True)
+            if '</body>' in body:
+                response.set_data(body.replace('</body>', render_panel(profile, repeated) + '</body>', 1))
+        return response
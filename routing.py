@@ -0,0 +1,134 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session as cookie_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+
+#----------------------------------------------------------------------------#
+# Read/write routing.
+#
+# Views decorated with @read_only run their queries against one of the
+# replica databases in SQLALCHEMY_REPLICA_URIS. Everything else, every flush,
+# and every read in a session that has already written stays on the primary.
+# After a request commits a write, the visitor's following requests stick to
+# the primary for REPLICA_STICKY_SECONDS so a redirect to the edited page
+# does not read a lagging replica. A request reads from one replica only.
+#----------------------------------------------------------------------------#
+
+STICKY_KEY = 'db_primary_until'
+
+
+def replica_bind_keys(config):
+    return ['replica%d' % i for i in range(len(config.get('SQLALCHEMY_REPLICA_URIS') or []))]
+
+
+def configure_replicas(config):
+    # Register each replica as a Flask-SQLAlchemy bind so it gets an engine
+    # with the same pool settings as the primary.
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for key, uri in zip(replica_bind_keys(config), config.get('SQLALCHEMY_REPLICA_URIS') or []):
+        binds[key] = uri
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+class ReplicaSet(object):
+
+    def __init__(self, db, app, keys, selection='round_robin'):
+        self.db = db
+        self.app = app
+        self.keys = keys
+        self.selection = selection
+        self.lock = threading.Lock()
+        self.cycle = itertools.cycle(keys)
+
+    def engines(self):
+        return [self.db.get_engine(self.app, bind=key) for key in self.keys]
+
+    def choose(self):
+        if self.selection == 'least_loaded':
+            # Fewest connections currently checked out of the replica's pool.
+            def load(engine):
+                checkedout = getattr(engine.pool, 'checkedout', None)
+                return checkedout() if checkedout else 0
+            return min(self.engines(), key=load)
+        with self.lock:
+            key = next(self.cycle)
+        return self.db.get_engine(self.app, bind=key)
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase):
+            # Query.update()/delete() pick their bind before any event fires.
+            self.info['wrote'] = True
+        replicas = get_state(self.app).db.replicas
+        if replicas is not None and self.reads_from_replica():
+            # One replica for the whole session, i.e. the request: replicas
+            # lag by different amounts, and a page's validator and body
+            # must see the same data.
+            if 'replica' not in self.info:
+                self.info['replica'] = replicas.choose()
+            return self.info['replica']
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def reads_from_replica(self):
+        if self._flushing or self.info.get('wrote') or not has_request_context():
+            return False
+        if not g.get('db_read_only'):
+            return False
+        return cookie_session.get(STICKY_KEY, 0) < time.time()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    replicas = None
+
+    def init_app(self, app):
+        configure_replicas(app.config)
+        SQLAlchemy.init_app(self, app)
+        keys = replica_bind_keys(app.config)
+        if keys:
+            self.replicas = ReplicaSet(self, app, keys,
+                                       app.config.get('REPLICA_SELECTION', 'round_robin'))
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_scoped_session(self, options=None):
+        scoped = SQLAlchemy.create_scoped_session(self, options)
+
+        # The flag lives as long as the session, i.e. until the end of the
+        # request, so later reads in the same session stay on the primary.
+        def wrote(session, flush_context):
+            session.info['wrote'] = True
+
+        def bulk_wrote(context):
+            context.session.info['wrote'] = True
+
+        def committed(session):
+            if session.info.get('wrote') and has_request_context():
+                sticky = session.app.config.get('REPLICA_STICKY_SECONDS', 0)
+                if sticky:
+                    cookie_session[STICKY_KEY] = time.time() + sticky
+
+        event.listen(scoped, 'after_flush', wrote)
+        event.listen(scoped, 'after_bulk_update', bulk_wrote)
+        event.listen(scoped, 'after_bulk_delete', bulk_wrote)
+        event.listen(scoped, 'after_commit', committed)
+        return scoped
+
+
+def read_only(view):
+    """Allow the decorated view's queries to be served by a replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    # Lets serve_async.py tell read endpoints from the rest.
+    wrapper.read_only = True
+    return wrapper
@@ -0,0 +1,165 @@
+import re
+import threading
+from collections import namedtuple
+
+from sqlalchemy import func, literal, over
+
+from pagination import keyset_paginate, paginate_sequence
+
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#
+# Every searchable row has a lower-cased document built from its name, city,
+# state and genres. On Postgres the document is the ``search_text`` column,
+# kept up to date by a trigger and covered by a pg_trgm GIN index (see
+# migration c5d1e0a7b3f2), so both substring and fuzzy matches are index
+# scans. MemorySearch answers the same API from an in-process trigram
+# index, without a database, for tests.
+#----------------------------------------------------------------------------#
+
+# Default of pg_trgm.word_similarity_threshold.
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+Hit = namedtuple('Hit', ['id', 'name', 'rank'])
+
+
+class SearchResult(object):
+
+    def __init__(self, count, page):
+        self.count = count
+        self.page = page
+
+
+def search_document(name, city, state, genres):
+    # Mirrors the search_text_document() trigger in the migration.
+    return ' '.join(part for part in [name, city, state] + list(genres or []) if part).lower()
+
+
+def trigrams(text):
+    # Same decomposition as pg_trgm: each alphanumeric word is padded with two
+    # spaces in front and one behind before being cut into trigrams.
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = '  ' + word + ' '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PostgresSearch(object):
+    """Ranked search on the trigram-indexed ``search_text`` column."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def search(self, model, term, cursor=None, per_page=None, genre=None):
+        term = term.strip().lower()
+        document = model.search_text
+        rank = func.word_similarity(term, document)
+        matches = self.session.query(
+                model.id, model.name, rank.label('rank'),
+                over(func.count()).label('total')) \
+            .filter(document.like('%' + _like_escape(term) + '%', escape='\\')
+                    | literal(term).op('<%')(document))
+        if genre:
+            matches = matches.filter(model.genres.contains([genre]))
+        matches = matches.subquery()
+        # The window count is taken over every match before the page is cut,
+        # so the total comes back with the rows of the same statement.
+        page = keyset_paginate(self.session.query(matches),
+                               [matches.c.rank.desc(), matches.c.id],
+                               cursor=cursor, per_page=per_page)
+        count = page.items[0].total if page.items else 0
+        page.items = [Hit(row.id, row.name, row.rank) for row in page.items]
+        return SearchResult(count, page)
+
+
+class TrigramIndex(object):
+    """In-process inverted index from trigram to document ids."""
+
+    def __init__(self):
+        self.documents = {}
+        self.names = {}
+        self.genres = {}
+        self.postings = {}
+
+    def add(self, id, name, document, genres=()):
+        self.discard(id)
+        self.documents[id] = document
+        self.names[id] = name
+        self.genres[id] = frozenset(genres)
+        for gram in trigrams(document):
+            self.postings.setdefault(gram, set()).add(id)
+
+    def discard(self, id):
+        document = self.documents.pop(id, None)
+        self.names.pop(id, None)
+        self.genres.pop(id, None)
+        if document is None:
+            return
+        for gram in trigrams(document):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.postings[gram]
+
+    def search(self, term, genre=None, threshold=WORD_SIMILARITY_THRESHOLD):
+        # Returns every match as a Hit, best first, optionally only those
+        # of one genre. The rank is the share of the term's trigrams found
+        # in the document, an approximation of pg_trgm's word_similarity().
+        term = term.strip().lower()
+        wanted = trigrams(term)
+        shared = {}
+        for gram in wanted:
+            for id in self.postings.get(gram, ()):
+                shared[id] = shared.get(id, 0) + 1
+        if len(term) < 3:
+            # Too short to have a trigram in common with a longer word; fall
+            # back to substring matching over every document.
+            candidates = self.documents.keys()
+        else:
+            candidates = shared.keys()
+        hits = []
+        for id in candidates:
+            if genre and genre not in self.genres[id]:
+                continue
+            rank = float(shared.get(id, 0)) / len(wanted) if wanted else 0.0
+            if term in self.documents[id] or rank >= threshold:
+                hits.append(Hit(id, self.names[id], rank))
+        hits.sort(key=lambda hit: (-hit.rank, hit.id))
+        return hits
+
+
+class MemorySearch(object):
+    """The PostgresSearch API answered from a TrigramIndex per model.
+
+    Rows are given with add() rather than read from a table, so tests can
+    use it in place of PostgresSearch, e.g. as app.extensions['search'].
+    """
+
+    def __init__(self):
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def add(self, model, id, name, city, state, genres=()):
+        with self.lock:
+            index = self.indexes.setdefault(model, TrigramIndex())
+            index.add(id, name, search_document(name, city, state, genres), genres or ())
+
+    def discard(self, model, id):
+        with self.lock:
+            if model in self.indexes:
+                self.indexes[model].discard(id)
+
+    def search(self, model, term, cursor=None, per_page=None, genre=None):
+        with self.lock:
+            index = self.indexes.get(model)
+            hits = index.search(term, genre) if index is not None else []
+        page = paginate_sequence(hits, ['rank', 'id'], (True, False),
+                                 cursor=cursor, per_page=per_page)
+        return SearchResult(len(hits), page)
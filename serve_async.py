@@ -0,0 +1,65 @@
+"""Serve the app with gevent.
+
+Each request runs in a greenlet and psycopg2 is switched to its
+asynchronous mode through psycogreen, so a query waiting on Postgres yields
+to the other requests instead of blocking the worker. One process keeps
+many queries in flight. The app, models, templates and Flask-SQLAlchemy
+session are the same as in the threaded server; the session is scoped per
+greenlet.
+
+    python serve_async.py --port 8000 --read-only
+    gunicorn -k gevent -w 4 serve_async:app
+
+Every in-flight request holds a pooled connection, so raise DB_POOL_SIZE
+(or put PgBouncer in front of Postgres) to match the concurrency you
+expect. With --read-only (or ASYNC_READ_ONLY=1) only the @read_only
+endpoints are served, so a load balancer can send the read-heavy pages
+here and everything else to the regular workers.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+import argparse
+import os
+
+from flask import abort, request
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from app import app
+
+
+def serve_reads_only():
+    @app.before_request
+    def reject_writes():
+        view = app.view_functions.get(request.endpoint)
+        if request.endpoint != 'static' and not getattr(view, 'read_only', False):
+            abort(404)
+
+
+READ_ONLY = os.environ.get('ASYNC_READ_ONLY', '').lower() in ('1', 'true', 'yes')
+if READ_ONLY:
+    serve_reads_only()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--connections', type=int, default=1000,
+                        help='Most requests handled at once.')
+    parser.add_argument('--read-only', action='store_true',
+                        help='Serve only the read endpoints.')
+    options = parser.parse_args()
+    if options.read_only and not READ_ONLY:
+        serve_reads_only()
+    server = WSGIServer((options.host, options.port), app, spawn=Pool(options.connections))
+    print('Serving on http://%s:%d' % (options.host, options.port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
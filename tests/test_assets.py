@@ -0,0 +1,44 @@
+from assets import minify_css, minify_js
+
+
+def test_css_comments_and_whitespace_are_removed():
+    css = """
+    /* layout */
+    .nav > li ,
+    .nav a {
+        color : red ;
+        margin: 0 auto;
+    }
+    """
+    assert minify_css(css, '/static/css') == '.nav>li,.nav a{color :red;margin:0 auto}'
+
+
+def test_css_license_comments_and_strings_are_kept():
+    css = '/*! Bootstrap | MIT */\na:after { content: "  /* not a comment */  "; }'
+    assert minify_css(css, '/static/css') == \
+        '/*! Bootstrap | MIT */ a:after{content:"  /* not a comment */  "}'
+
+
+def test_css_descendant_pseudo_classes_keep_their_space():
+    assert minify_css('a :hover { color: red }', '/') == 'a :hover{color:red}'
+
+
+def test_css_urls_are_made_absolute():
+    css = ("a { background: url(../img/a.png) } b { background: url('/img/b.png') }"
+           ' c { background: url("data:image/png;base64,xx") } d { background: url(fonts/) }')
+    assert minify_css(css, '/static/css') == (
+        'a{background:url("/static/img/a.png")}b{background:url("/img/b.png")}'
+        'c{background:url("data:image/png;base64,xx")}d{background:url("/static/css/fonts/")}')
+
+
+def test_js_drops_indentation_blank_lines_and_line_comments():
+    js = """
+    // Toggle the menu.
+    $(function () {
+
+        var url = 'http://example.com'; // kept
+        $('.menu').toggle();
+    });
+    """
+    assert minify_js(js) == \
+        "$(function () {\nvar url = 'http://example.com'; // kept\n$('.menu').toggle();\n});"
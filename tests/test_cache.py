@@ -0,0 +1,81 @@
+import os
+
+from cache import LRUCache
+from images import DiskLRU
+
+
+def test_least_recently_used_entries_go_first():
+    cache = LRUCache(max_bytes=30)
+    cache.set('a', 'A', 10)
+    cache.set('b', 'B', 10)
+    cache.set('c', 'C', 10)
+    assert cache.get('a') == 'A'
+    cache.set('d', 'D', 10)
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['A', 'C', 'D']
+    assert cache.size == 30
+
+
+def test_replacing_an_entry_counts_its_new_size():
+    cache = LRUCache(max_bytes=30)
+    cache.set('a', 'A', 10)
+    cache.set('a', 'AA', 20)
+    assert cache.size == 20 and cache.get('a') == 'AA'
+
+
+def test_entries_larger_than_the_cache_are_not_stored():
+    cache = LRUCache(max_bytes=30)
+    cache.set('a', 'A', 10)
+    cache.set('big', 'B', 31)
+    assert cache.get('big') is None and cache.get('a') == 'A'
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.time', lambda: now[0])
+    cache = LRUCache(max_bytes=30, default_ttl=60)
+    cache.set('a', 'A', 10)
+    cache.set('b', 'B', 10, ttl=120)
+    now[0] += 61
+    assert cache.get('a') is None and cache.get('b') == 'B'
+    assert cache.size == 10
+
+
+def test_invalidation_drops_tagged_entries():
+    cache = LRUCache(max_bytes=100)
+    cache.set('/venues/1', 'one', 10, tags=['venue:1', 'venues'])
+    cache.set('/venues/2', 'two', 10, tags=['venue:2', 'venues'])
+    cache.set('/artists/1', 'three', 10, tags=['artist:1'])
+    cache.invalidate(['venue:1'])
+    assert cache.get('/venues/1') is None and cache.get('/venues/2') == 'two'
+    cache.invalidate(['venues'])
+    assert cache.get('/venues/2') is None and cache.get('/artists/1') == 'three'
+    assert set(cache.tags) == {'artist:1'}
+
+
+def age(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_disk_cache_stores_equal_files_once(tmp_path):
+    disk = DiskLRU(str(tmp_path), max_bytes=1000)
+    first = disk.set('http://a/1.png', b'x' * 10, '.png')
+    assert disk.set('http://b/1.png', b'x' * 10, '.png') == first
+    assert disk.get('http://a/1.png') == disk.get('http://b/1.png') == first
+    assert disk.get('http://c/1.png') is None
+    assert disk.size == 10
+
+
+def test_disk_cache_evicts_the_least_recently_served_files(tmp_path):
+    disk = DiskLRU(str(tmp_path), max_bytes=100)
+    paths = [disk.set(str(i), bytes([i]) * 40) for i in range(2)]
+    age(paths[0], 20)
+    age(paths[1], 30)
+    # Serving the older file makes it the newest.
+    disk.get('1')
+    disk.set('2', b'\x02' * 40)
+    assert disk.get('0') is None
+    assert disk.get('1') == paths[1] and disk.get('2') is not None
+    # Eviction leaves the directory at no more than 90% of the limit.
+    assert disk.size == 80
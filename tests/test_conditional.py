@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from conditional import Version, conditional
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.calls = 0
+    app.version = Version(1, datetime(2026, 1, 1, 12, 0, 0, 500))
+
+    @app.route('/venues/<int:venue_id>')
+    @conditional(lambda venue_id: app.version)
+    def show_venue(venue_id):
+        app.calls += 1
+        return 'venue %d' % venue_id
+
+    client = app.test_client()
+    client.application = app
+    return client
+
+
+def test_responses_carry_validators(client):
+    response = client.get('/venues/1')
+    assert response.status_code == 200 and response.data == b'venue 1'
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified'] == 'Thu, 01 Jan 2026 12:00:00 GMT'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+
+def test_matching_etag_skips_the_view(client):
+    etag = client.get('/venues/1').headers['ETag']
+    response = client.get('/venues/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b''
+    assert response.headers['ETag'] == etag
+    assert client.application.calls == 1
+
+
+def test_etags_differ_per_url_and_version(client):
+    etag = client.get('/venues/1').headers['ETag']
+    assert client.get('/venues/2', headers={'If-None-Match': etag}).status_code == 200
+    client.application.version = Version(2, None)
+    response = client.get('/venues/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert 'Last-Modified' not in response.headers
+
+
+def test_if_modified_since(client):
+    headers = {'If-Modified-Since': 'Thu, 01 Jan 2026 12:00:00 GMT'}
+    assert client.get('/venues/1', headers=headers).status_code == 304
+    headers = {'If-Modified-Since': 'Thu, 01 Jan 2026 11:59:59 GMT'}
+    assert client.get('/venues/1', headers=headers).status_code == 200
+
+
+def test_if_none_match_takes_precedence(client):
+    headers = {'If-None-Match': '"stale"', 'If-Modified-Since': 'Thu, 01 Jan 2026 12:00:00 GMT'}
+    assert client.get('/venues/1', headers=headers).status_code == 200
+
+
+def test_pages_with_flashed_messages_are_not_validated(client):
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Venue was listed')]
+    response = client.get('/venues/1')
+    assert response.status_code == 200 and 'ETag' not in response.headers
@@ -0,0 +1,50 @@
+import math
+
+from geo import KM_PER_DEGREE, Geocoder, geocell
+
+PLACES = """city,state,latitude,longitude
+New York,NY,40.7128,-74.0060
+Brooklyn,NY,40.6782,-73.9442
+Philadelphia,PA,39.9526,-75.1652
+Boston,MA,42.3601,-71.0589
+Twin,NY,40.7128,-74.0060
+"""
+
+
+def geocoder(tmp_path):
+    path = tmp_path / 'places.csv'
+    path.write_text(PLACES)
+    return Geocoder(str(path))
+
+
+def test_nearby_points_share_geocell_prefixes():
+    here = geocell(40.7128, -74.0060)
+    assert geocell(40.7129, -74.0061) >> 20 == here >> 20
+    assert geocell(-33.8688, 151.2093) >> 20 != here >> 20
+
+
+def test_locate_is_city_level(tmp_path):
+    places = geocoder(tmp_path)
+    assert places.locate(' new york ', 'ny') == {
+        'latitude': 40.7128, 'longitude': -74.0060, 'geocell': geocell(40.7128, -74.0060)}
+    assert places.locate('Nowhere', 'NY') == {'latitude': None, 'longitude': None, 'geocell': None}
+
+
+def test_nearby_is_nearest_first_within_the_radius(tmp_path):
+    places = geocoder(tmp_path)
+    groups = places.nearby(40.7128, -74.0060, 150)
+    # New York and Twin share a position, so one entry and one geocell.
+    assert [cells for distance, cells in groups] == [
+        [geocell(40.7128, -74.0060)], [geocell(40.6782, -73.9442)], [geocell(39.9526, -75.1652)]]
+    assert groups[0][0] == 0.0
+    assert math.sqrt(groups[-1][0]) * KM_PER_DEGREE < 150
+
+
+def test_nearby_keeps_to_the_box(tmp_path):
+    places = geocoder(tmp_path)
+    groups = places.nearby(40.7128, -74.0060, 500, box=(40.0, -74.5, 41.0, -73.98))
+    assert [cells for distance, cells in groups] == [[geocell(40.7128, -74.0060)]]
+
+
+def test_nearby_finds_nothing_far_away(tmp_path):
+    assert geocoder(tmp_path).nearby(0.0, 0.0, 500) == []
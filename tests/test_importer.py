@@ -0,0 +1,97 @@
+import io
+import json
+from datetime import timedelta
+
+from importer import BulkImporter, RowChecker
+from phones import normalize_phone
+
+VENUE = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+         'address': '1015 Folsom Street', 'genres': ['Jazz']}
+
+
+def check(record):
+    errors = []
+    values = RowChecker(normalize_phone).venue(record, errors)
+    return values, errors
+
+
+def test_non_string_genres_are_rejected():
+    values, errors = check(dict(VENUE, genres=[1, 'Jazz']))
+    assert errors == ['genres must be strings']
+
+
+def test_genres_that_are_not_a_list_are_rejected():
+    values, errors = check(dict(VENUE, genres={'name': 'Jazz'}))
+    assert errors == ['genres must be a list']
+
+
+def test_import_rejects_bad_genres_row_by_row():
+    rejects = io.StringIO()
+    importer = BulkImporter(None, None, RowChecker(normalize_phone).venue, rejects=rejects)
+    records = [(1, dict(VENUE, genres=[1])), (2, dict(VENUE, genres=[None])), (3, 'not json')]
+    assert importer.run(records) == (0, 3)
+    lines = [json.loads(line) for line in rejects.getvalue().splitlines()]
+    assert [(line['line'], line['errors']) for line in lines] == [
+        (1, ['genres must be strings']),
+        (2, ['genres must be strings']),
+        (3, ['not a JSON object']),
+    ]
+
+
+def test_bulk_patch_rejects_non_string_genres():
+    errors = []
+    values = RowChecker(normalize_phone).changes('venue', {'genres': [1]}, errors)
+    assert errors == ['genres must be strings']
+    assert values == {'genres': []}
+
+
+def test_bulk_patch_checks_only_the_fields_given():
+    errors = []
+    values = RowChecker(normalize_phone).changes('artist', {'genres': 'Jazz; Rock n Roll', 'seeking_venue': 'yes'}, errors)
+    assert errors == []
+    assert values == {'genres': ['Jazz', 'Rock n Roll'], 'seeking_venue': True}
+
+
+def test_venue_values_are_checked_and_normalized():
+    values, errors = check(dict(VENUE, phone='415-555-0123', website='https://hop.example'))
+    assert errors == []
+    assert values['phone_e164'] == '+14155550123'
+    assert values['website'] == 'https://hop.example'
+    assert values['facebook_link'] is None
+    assert values['seeking_talent'] is False
+
+
+def test_every_problem_of_a_record_is_reported():
+    values, errors = check({'name': ' ', 'city': 'Springfield', 'state': 'XX', 'address': 7,
+                            'phone': '555', 'image_link': 'not a url', 'genres': ['Polka']})
+    assert errors == [
+        'name is required',
+        'address must be a string',
+        'unknown state XX',
+        'Not a valid phone number. Phone numbers must look like 333-222-1111.',
+        'image_link is not a valid URL',
+        'unknown genres: Polka',
+    ]
+
+
+def test_venues_are_located():
+    checker = RowChecker(normalize_phone, locate=lambda city, state: {'geocell': (city, state)})
+    errors = []
+    assert checker.venue(VENUE, errors)['geocell'] == ('San Francisco', 'CA')
+
+
+def test_shows_get_a_default_length():
+    errors = []
+    values = RowChecker(normalize_phone).show(
+        {'artist_id': 4, 'venue_id': '1', 'start_time': '2026-01-01 20:00'}, errors)
+    assert errors == []
+    assert values['end_time'] - values['start_time'] == timedelta(hours=2)
+
+
+def test_show_problems_are_reported():
+    errors = []
+    RowChecker(normalize_phone).show(
+        {'artist_id': 'four', 'start_time': '2026-01-01 20:00', 'end_time': '2026-01-01 19:00'},
+        errors)
+    assert errors == ['artist_id must be an integer', 'venue_id must be an integer',
+                      'end_time must be after start_time']
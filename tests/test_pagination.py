@@ -0,0 +1,76 @@
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from werkzeug.exceptions import BadRequest
+
+from pagination import NEXT, PREV, decode_cursor, encode_cursor, page_size, paginate_sequence
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(PAGE_SIZE=2, MAX_PAGE_SIZE=3)
+    with app.test_request_context('/'):
+        yield app
+
+
+def test_cursors_round_trip_dates_and_times():
+    values = [datetime(2026, 1, 1, 20, 30, 15, 500), date(2026, 1, 2), 'Jazz', 7, None]
+    token = encode_cursor(PREV, values)
+    assert '=' not in token
+    assert decode_cursor(token, 5) == (PREV, values)
+
+
+@pytest.mark.parametrize('token', [
+    'not base64!',
+    encode_cursor(NEXT, [1]) + 'x',
+    encode_cursor('sideways', [1, 2]),
+    encode_cursor(NEXT, [1]),
+    encode_cursor(NEXT, [{'x': 1}, 2]),
+])
+def test_bad_cursors_are_bad_requests(app, token):
+    with pytest.raises(BadRequest):
+        decode_cursor(token, 2)
+
+
+def test_page_size_defaults_and_limits(app):
+    assert page_size() == 2
+    assert page_size(10) == 3
+    assert page_size(0) == 1
+    with app.test_request_context('/?per_page=3'):
+        assert page_size() == 3
+
+
+class Row(object):
+
+    def __init__(self, rank, id):
+        self.rank = rank
+        self.id = id
+
+
+ROWS = [Row(9, 1), Row(9, 2), Row(5, 3), Row(5, 4), Row(1, 5)]
+
+
+def ids(page):
+    return [row.id for row in page]
+
+
+def test_sequence_pages_forward_and_back(app):
+    def paginate(cursor=None):
+        return paginate_sequence(ROWS, ['rank', 'id'], (True, False), cursor=cursor)
+
+    first = paginate()
+    assert ids(first) == [1, 2] and not first.has_prev
+    second = paginate(first.next_cursor)
+    assert ids(second) == [3, 4] and second.has_prev
+    last = paginate(second.next_cursor)
+    assert ids(last) == [5] and not last.has_next
+    assert ids(paginate(last.prev_cursor)) == [3, 4]
+    assert ids(paginate(second.prev_cursor)) == [1, 2]
+
+
+def test_sequence_cursor_from_the_query_string(app):
+    token = paginate_sequence(ROWS, ['rank', 'id'], (True, False)).next_cursor
+    with app.test_request_context('/', query_string={'cursor': token, 'per_page': 3}):
+        assert ids(paginate_sequence(ROWS, ['rank', 'id'], (True, False))) == [3, 4, 5]
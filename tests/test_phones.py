@@ -0,0 +1,30 @@
+import pytest
+from wtforms.validators import ValidationError
+
+from phones import PhoneNumber, normalize_phone
+
+
+@pytest.mark.parametrize('number', [
+    '415-555-0123', '(415) 555-0123', '415.555.0123', ' 4155550123 ', '+1 415 555 0123',
+])
+def test_us_numbers_are_stored_in_e164(number):
+    assert normalize_phone(number) == '+14155550123'
+
+
+def test_numbers_with_a_country_code_keep_it():
+    assert normalize_phone('+44 20 7946 0958') == '+442079460958'
+
+
+@pytest.mark.parametrize('number', [None, '', '   '])
+def test_blank_numbers_are_none(number):
+    assert normalize_phone(number) is None
+
+
+@pytest.mark.parametrize('number', ['555', 'call me', '415-555-0123-4567-89'])
+def test_invalid_numbers_raise(number):
+    with pytest.raises(ValidationError):
+        normalize_phone(number)
+
+
+def test_default_region():
+    assert PhoneNumber('GB').normalize('020 7946 0958') == '+442079460958'
@@ -0,0 +1,76 @@
+import pytest
+from flask import Flask
+
+from search import MemorySearch, TrigramIndex, search_document, trigrams
+
+
+@pytest.fixture
+def request_context():
+    with Flask(__name__).test_request_context('/'):
+        yield
+
+
+@pytest.fixture
+def engine():
+    engine = MemorySearch()
+    engine.add('Venue', 1, 'The Musical Hop', 'San Francisco', 'CA', ['Jazz', 'Reggae'])
+    engine.add('Venue', 2, 'The Dueling Pianos Bar', 'New York', 'NY', ['Classical', 'R&B'])
+    engine.add('Venue', 3, 'Park Square Live Music & Coffee', 'San Francisco', 'CA',
+               ['Rock n Roll', 'Jazz', 'Classical', 'Folk'])
+    engine.add('Artist', 1, 'Guns N Petals', 'San Francisco', 'CA', ['Rock n Roll'])
+    return engine
+
+
+def test_trigrams_are_padded_like_pg_trgm():
+    assert trigrams('Hop') == {'  h', ' ho', 'hop', 'op '}
+    assert trigrams('a b') == {'  a', ' a ', '  b', ' b '}
+
+
+def test_search_document_skips_empty_parts():
+    assert search_document('Hop', None, 'CA', ['Jazz']) == 'hop ca jazz'
+
+
+def test_substring_and_fuzzy_matches(request_context, engine):
+    # The whole word outranks the prefix of "musical".
+    assert [hit.id for hit in engine.search('Venue', 'music', per_page=10).page] == [3, 1]
+    # A typo still finds the venue, ranked below exact matches.
+    result = engine.search('Venue', 'pianoss', per_page=10)
+    assert [hit.name for hit in result.page] == ['The Dueling Pianos Bar']
+    assert 0 < result.page.items[0].rank < 1
+
+
+def test_short_terms_match_substrings(request_context, engine):
+    assert [hit.id for hit in engine.search('Venue', 'ny', per_page=10).page] == [2]
+
+
+def test_models_are_searched_separately(request_context, engine):
+    assert engine.search('Artist', 'music', per_page=10).count == 0
+    assert engine.search('Show', 'music', per_page=10).count == 0
+
+
+def test_genre_filter(request_context, engine):
+    result = engine.search('Venue', 'san francisco', per_page=10, genre='Folk')
+    assert [hit.id for hit in result.page] == [3]
+
+
+def test_discard_removes_the_row(request_context, engine):
+    engine.discard('Venue', 3)
+    assert [hit.id for hit in engine.search('Venue', 'music', per_page=10).page] == [1]
+
+
+def test_pages_follow_cursors(request_context, engine):
+    first = engine.search('Venue', 'the', per_page=1)
+    assert first.count == 2 and first.page.has_next and not first.page.has_prev
+    second = engine.search('Venue', 'the', cursor=first.page.next_cursor, per_page=1)
+    assert [hit.id for hit in second.page] == [2]
+    assert not second.page.has_next
+    back = engine.search('Venue', 'the', cursor=second.page.prev_cursor, per_page=1)
+    assert [hit.id for hit in back.page] == [hit.id for hit in first.page]
+
+
+def test_readding_replaces_the_document():
+    index = TrigramIndex()
+    index.add(1, 'Old Name', 'old name')
+    index.add(1, 'New Name', 'new name')
+    assert index.search('old') == []
+    assert [hit.name for hit in index.search('new')] == ['New Name']
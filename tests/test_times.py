@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from importer import RowChecker
+from phones import normalize_phone
+from times import parse_time
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_times_are_kept(new_york):
+    assert parse_time('2026-01-01 20:00') == datetime(2026, 1, 1, 20, 0)
+
+
+def test_aware_times_become_naive_local(new_york):
+    assert parse_time('2026-01-01T20:00Z') == datetime(2026, 1, 1, 15, 0)
+    assert parse_time('2026-07-01T20:00+02:00') == datetime(2026, 7, 1, 14, 0)
+
+
+def test_aware_and_naive_times_compare(new_york):
+    # The mix that made /api/v1/venues/available fail with a TypeError.
+    assert parse_time('2026-01-01T20:00Z') < parse_time('2026-01-01 16:00')
+
+
+def test_imported_shows_are_stored_in_local_time(new_york):
+    errors = []
+    values = RowChecker(normalize_phone).show(
+        {'artist_id': '4', 'venue_id': '1', 'start_time': '2026-01-01T20:00Z',
+         'end_time': '2026-01-01 17:00'}, errors)
+    assert errors == []
+    assert values['start_time'] == datetime(2026, 1, 1, 15, 0)
+    assert values['start_time'].tzinfo is None
+
+
+def test_unparsable_times_raise_value_error():
+    with pytest.raises(ValueError):
+        parse_time('tomorrow-ish')
@@ -0,0 +1,22 @@
+import dateutil.parser
+
+#----------------------------------------------------------------------------#
+# Show times.
+#
+# Show start and end times are stored as naive local times (timestamp
+# without time zone). Times given with an offset, like 2026-01-01T20:00Z,
+# are converted to the server's local time before they reach a query.
+#----------------------------------------------------------------------------#
+
+
+def local_time(value):
+    """``value`` as a naive local datetime."""
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def parse_time(text):
+    """Parse a date and time into a naive local datetime. Raises ValueError
+    or OverflowError for text that is not one."""
+    return local_time(dateutil.parser.parse(text))